@@ -1,25 +1,46 @@
+import time
 import logging
 from collections import defaultdict
 
 logger = logging.getLogger("GlobalAggregator")
 
 class GlobalAggregator:
-    def __init__(self, zone_manager):
+    def __init__(self, zone_manager, report_ttl=None):
         """
         :param zone_manager: экземпляр ZoneManager с доступом к координатам и trust_score
+        :param report_ttl: через сколько секунд молчания камеры её отчёты удаляются (None — никогда)
         """
         self.zone_manager = zone_manager
+        self.report_ttl = report_ttl
         self.status_reports = defaultdict(dict)  # slot_id → {cam_id: bool}
+        self.last_seen = {}  # cam_id → время последнего отчёта
+        self.listeners = []  # callback(cam_id, {slot_id: bool | None}) — вызывается только для изменившихся отчётов
 
-    def update(self, cam_id, slot_statuses):
+    def add_listener(self, callback):
+        """
+        Подписка на изменения отчётов камер.
+        :param callback: callable(cam_id, changed) — changed: dict {slot_id: bool | None (отчёт удалён)}
+        """
+        self.listeners.append(callback)
+
+    def update(self, cam_id, slot_statuses, now=None):
         """
         Обновляет статус мест с одной камеры.
 
         :param cam_id: str — идентификатор камеры
         :param slot_statuses: dict {slot_id: bool (True — свободно, False — занято)}
         """
+        self.last_seen[cam_id] = now or time.time()
+        changed = {}
         for slot_id, is_free in slot_statuses.items():
-            self.status_reports[slot_id][cam_id] = is_free
+            reports = self.status_reports[slot_id]
+            if reports.get(cam_id) != is_free:
+                changed[slot_id] = is_free
+            reports[cam_id] = is_free
+
+        if changed:
+            for callback in self.listeners:
+                callback(cam_id, changed)
 
     def get_aggregated_status(self):
         """
@@ -27,25 +48,83 @@ class GlobalAggregator:
 
         :return: dict {slot_id: bool}
         """
-        aggregated = {}
-        for slot_id, reports in self.status_reports.items():
-            weighted_sum = 0.0
-            total_weight = 0.0
+        return {slot_id: self.aggregate_slot(slot_id) for slot_id in self.status_reports}
+
+    def aggregate_slot(self, slot_id):
+        """
+        Финальный статус одного места по отчётам всех камер, взвешенным по trust.
+
+        :return: bool (True — свободно) или None, если отчётов по месту нет
+        """
+        reports = self.status_reports.get(slot_id)
+        if not reports:
+            return None
+
+        weighted_sum = 0.0
+        total_weight = 0.0
+        for cam_id, is_free in reports.items():
+            weight = self.zone_manager.get_trust(cam_id, slot_id)
+            total_weight += weight
+            weighted_sum += weight * (1.0 if is_free else 0.0)
 
-            for cam_id, is_free in reports.items():
-                weight = self.zone_manager.get_trust(cam_id, slot_id)
-                total_weight += weight
-                weighted_sum += weight * (1.0 if is_free else 0.0)
+        if total_weight == 0:
+            logger.warning(f"[Aggregator] Нет данных доверия для {slot_id}, принимаем по умолчанию: занято")
+            return False
+        return weighted_sum / total_weight >= 0.5  # >= 0.5 → свободно, иначе занято
+
+    def drop_reports(self, cam_id, slot_ids):
+        """
+        Удаляет отчёты камеры по местам, которых больше нет в её разметке.
+        Слушатели получают удалённые места со значением None.
+        """
+        removed = {}
+        for slot_id in slot_ids:
+            reports = self.status_reports.get(slot_id)
+            if reports is None or cam_id not in reports:
+                continue
+            del reports[cam_id]
+            removed[slot_id] = None
+            if not reports:
+                del self.status_reports[slot_id]
+
+        if removed:
+            for callback in self.listeners:
+                callback(cam_id, removed)
+
+    def touch(self, cam_ids, now=None):
+        """Камеры живы, хотя их статусы не менялись (heartbeat от worker-узла)."""
+        now = now or time.time()
+        for cam_id in cam_ids:
+            self.last_seen[cam_id] = now
+
+    def expire(self, now=None):
+        """
+        Удаляет все отчёты камер, молчащих дольше report_ttl.
+        :return: список удалённых камер
+        """
+        if not self.report_ttl:
+            return []
+        now = now or time.time()
+        expired = [cam_id for cam_id, seen in self.last_seen.items() if now - seen > self.report_ttl]
+        for cam_id in expired:
+            del self.last_seen[cam_id]
+            self.drop_reports(cam_id, [slot_id for slot_id, reports in self.status_reports.items()
+                                       if cam_id in reports])
+            logger.info(f"[Aggregator] No reports from {cam_id} for {self.report_ttl:.0f}s, dropping its slots")
+        return expired
 
-            if total_weight == 0:
-                logger.warning(f"[Aggregator] Нет данных доверия для {slot_id}, принимаем по умолчанию: занято")
-                aggregated[slot_id] = False
-            else:
-                average = weighted_sum / total_weight
-                aggregated[slot_id] = average >= 0.5  # >= 0.5 → свободно, иначе занято
+    def get_state(self):
+        """Отчёты камер для снимка состояния: {slot_id: {cam_id: is_free}}."""
+        return {slot_id: dict(reports) for slot_id, reports in self.status_reports.items()}
 
-        return aggregated
+    def load_state(self, state, now=None):
+        now = now or time.time()
+        for slot_id, reports in state.items():
+            self.status_reports[slot_id].update(reports)
+            for cam_id in reports:
+                self.last_seen.setdefault(cam_id, now)
 
     def clear(self):
         """Очищает собранные отчёты — вызывать перед новым циклом."""
-        self.status_reports.clear()
\ No newline at end of file
+        self.status_reports.clear()
+        self.last_seen.clear()
\ No newline at end of file
@@ -1,22 +1,112 @@
 import json
+import time
 import logging
 
+import cv2
+import numpy as np
 from pathlib import Path
 
 from core.detector import ObjectDetector
+from core.synthetic import SyntheticCapture, is_synthetic
 from core.visualizer import draw_parking_zones
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("Calibrator")
 
 
+def _iou_matrix(a, b):
+    """IoU всех пар боксов: a (N, 4), b (M, 4) → (N, M)."""
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def cluster_boxes(frames_detections, cluster_iou=0.5, min_frames=3):
+    """
+    Кластеризует детекции по времени в стабильные места.
+
+    Каждая детекция кадра жадно (по убыванию IoU) привязывается к кластеру, чей средний бокс
+    перекрывается с ней не меньше cluster_iou; один кластер — не больше одной детекции на кадр.
+    Машины, проезжающие мимо, попадают лишь на один-два разнесённых во времени кадра и отсекаются
+    по абсолютному числу кадров min_frames, а не по доле: место, занятое редко (например, на 5% кадров),
+    остаётся местом. Цена — машина, стоявшая на проезде дольше min_frames шагов выборки (очередь
+    у шлагбаума), тоже станет местом; при плотной выборке (маленький stride) min_frames стоит увеличить.
+
+    :param frames_detections: список списков детекций [(x1, y1, x2, y2, cls_id, conf)] — по кадрам
+    :param cluster_iou: порог IoU привязки детекции к кластеру
+    :param min_frames: минимальное число кадров, на которых место было занято
+    :return: список dict {"coords": медианный бокс, "frequency": доля кадров, "stability": средний IoU с медианой}
+             по убыванию частоты
+    """
+    n_frames = len(frames_detections)
+    members = []  # индекс кластера → список боксов
+    means = np.zeros((0, 4), dtype=np.float64)
+
+    for detections in frames_detections:
+        if not detections:
+            continue
+        boxes = np.array([d[:4] for d in detections], dtype=np.float64)
+        assigned = np.full(len(boxes), -1)
+        if len(means):
+            iou = _iou_matrix(means, boxes)
+            taken = set()
+            for flat in np.argsort(-iou, axis=None):
+                c, d = np.unravel_index(flat, iou.shape)
+                if iou[c, d] < cluster_iou:
+                    break
+                if c in taken or assigned[d] >= 0:
+                    continue
+                taken.add(c)
+                assigned[d] = c
+
+        new = []
+        for d, c in enumerate(assigned):
+            if c >= 0:
+                members[c].append(boxes[d])
+                means[c] += (boxes[d] - means[c]) / len(members[c])
+            else:
+                members.append([boxes[d]])
+                new.append(boxes[d])
+        if new:
+            means = np.vstack([means, new])
+
+    slots = []
+    for boxes in members:
+        if len(boxes) < min_frames:
+            continue
+        frequency = len(boxes) / max(1, n_frames)
+        boxes = np.array(boxes)
+        median = np.median(boxes, axis=0)
+        stability = float(_iou_matrix(median[None, :], boxes).mean())
+        slots.append({"coords": [int(round(v)) for v in median], "frequency": frequency, "stability": stability})
+    slots.sort(key=lambda slot: -slot["frequency"])
+
+    # Кластеры, сошедшиеся к одному месту (например, разные машины со сдвигом) — оставляем самый частый
+    kept = []
+    for slot in slots:
+        box = np.array([slot["coords"]], dtype=np.float64)
+        if kept and _iou_matrix(box, np.array([k["coords"] for k in kept], dtype=np.float64)).max() >= cluster_iou:
+            continue
+        kept.append(slot)
+    return kept
+
+
 class ParkingCalibrator:
-    def __init__(self, detector, output_dir="config/zones"):
+    def __init__(self, detector=None, output_dir="config/zones", model_path="yolov8s.pt", conf_threshold=0.3):
         """
-        :param detector: экземпляр ObjectDetector
+        :param detector: экземпляр ObjectDetector; если не задан — создаётся по model_path
+                         (модель берётся из общего кэша процесса)
         :param output_dir: куда сохранять json-файл с зонами
+        :param model_path: путь к весам, если detector не передан
+        :param conf_threshold: порог уверенности, если detector не передан
         """
-        self.detector = detector
+        self.detector = detector or ObjectDetector(model_path, conf_threshold=conf_threshold)
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
@@ -46,4 +136,87 @@ class ParkingCalibrator:
             cv2.waitKey(0)
             cv2.destroyAllWindows()
 
-        return zones
\ No newline at end of file
+        return zones
+
+    def _sample_frames(self, cap, max_frames, stride, seek_stride):
+        """
+        Генератор кадров с шагом stride. Пропущенные кадры не декодируются: при небольшом шаге — grab(),
+        при большом — перемотка CAP_PROP_POS_FRAMES (декодирование только от ближайшего ключевого кадра).
+        """
+        position = 0
+        for _ in range(max_frames):
+            ret, frame = cap.read()
+            if not ret:
+                return
+            yield frame
+            position += stride
+            if stride >= seek_stride:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+            else:
+                for _ in range(stride - 1):
+                    if not cap.grab():
+                        return
+
+    def calibrate_from_video(self, source, cam_id, max_frames=300, stride=None, batch_size=8, imgsz=None,
+                             cluster_iou=0.5, min_frames=3, seek_stride=50, save=True):
+        """
+        Калибровка по множеству кадров видео: места, пустые на одном кадре, находятся на других,
+        а проезжающие машины отсекаются по числу кадров, на которых они видны.
+
+        :param source: путь к видео или URL потока
+        :param cam_id: идентификатор камеры
+        :param max_frames: сколько кадров проанализировать
+        :param stride: шаг между кадрами (None — равномерно по всему видео)
+        :param batch_size: кадров в одном вызове детектора
+        :param imgsz: размер входа модели (None — по умолчанию для модели)
+        :param cluster_iou: порог IoU привязки детекции к месту
+        :param min_frames: минимальное число кадров, на которых место занято (см. cluster_boxes)
+        :param seek_stride: начиная с какого шага пропуск кадров делается перемоткой, а не grab()
+        :param save: сохранить ли результат в config/zones/{cam_id}.json
+        :return: словарь зон {slot_N: {"name", "coords", "trust", "occupancy"}}
+        """
+        cap = SyntheticCapture(source) if is_synthetic(source) else cv2.VideoCapture(source)
+        if not cap.isOpened():
+            raise ValueError(f"Cannot open video source: {source}")
+
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if stride is None:
+            stride = max(1, total // max_frames) if total > 0 else 1
+        detect_batch = getattr(self.detector, "detect_batch", None)
+
+        start = time.perf_counter()
+        frames_detections, batch = [], []
+        try:
+            for frame in self._sample_frames(cap, max_frames, stride, seek_stride):
+                batch.append(frame)
+                if len(batch) == batch_size:
+                    frames_detections.extend(self._detect_batch(batch, detect_batch, imgsz))
+                    batch = []
+            frames_detections.extend(self._detect_batch(batch, detect_batch, imgsz))
+        finally:
+            cap.release()
+
+        slots = cluster_boxes(frames_detections, cluster_iou=cluster_iou, min_frames=min_frames)
+        # trust — насколько стабильно модель локализует место (дрожание и перекрытия снижают его)
+        zones = {
+            f"slot_{idx}": {"name": f"slot_{idx}", "coords": slot["coords"],
+                            "trust": round(min(1.0, max(0.1, slot["stability"])), 2),
+                            "occupancy": round(slot["frequency"], 3)}
+            for idx, slot in enumerate(slots, 1)
+        }
+        logger.info(f"[Calibrator] {cam_id}: {len(frames_detections)} frames (stride {stride}) "
+                    f"in {time.perf_counter() - start:.1f}s → {len(zones)} stable slots")
+
+        if save:
+            path = self.output_dir / f"{cam_id}.json"
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(zones, f, indent=2, ensure_ascii=False)
+            logger.info(f"[Calibrator] Saved zones to {path}")
+        return zones
+
+    def _detect_batch(self, frames, detect_batch, imgsz):
+        if not frames:
+            return []
+        if detect_batch:
+            return detect_batch(frames, imgsz=imgsz)
+        return [self.detector.detect(frame, imgsz=imgsz) for frame in frames]
\ No newline at end of file
@@ -0,0 +1,133 @@
+import logging
+from collections import defaultdict
+
+import numpy as np
+
+from core.utils import clamp, rescale_detections, scale_box
+
+logger = logging.getLogger("Cascade")
+
+DEFAULT_ESCALATION = {
+    "conf_low": 0.1,     # детекции с уверенностью в [conf_low, conf_high) считаются сомнительными
+    "conf_high": 0.4,
+    "iou_margin": 0.1,   # |IoU - iou_threshold| <= iou_margin — место на границе решения
+    "mode": "crop",      # crop — большая модель только на области сомнительных мест / frame — на весь кадр
+    "padding": 0.2,      # расширение области кропа относительно её размера
+}
+
+
+class CascadeDetector:
+    def __init__(self, fast_detector, accurate_detector, zone_manager, escalation=None, cameras=None):
+        """
+        Двухступенчатый каскад: быстрая модель на каждом кадре, точная — только на сомнительных местах.
+
+        :param fast_detector: ObjectDetector с лёгкой моделью (например, yolov8n)
+        :param accurate_detector: ObjectDetector с точной моделью (например, yolov8s)
+        :param zone_manager: экземпляр ZoneManager — зоны и iou_threshold
+        :param escalation: dict — пороги эскалации по умолчанию (см. DEFAULT_ESCALATION)
+        :param cameras: dict {cam_id: dict} — переопределение порогов для отдельных камер
+        """
+        self.fast_detector = fast_detector
+        self.accurate_detector = accurate_detector
+        self.zone_manager = zone_manager
+        self.escalation = {**DEFAULT_ESCALATION, **(escalation or {})}
+        self.cameras = cameras or {}
+        self.frames = defaultdict(int)  # cam_id → число кадров
+        self.escalations = defaultdict(int)  # cam_id → число эскалаций
+
+    def get_thresholds(self, cam_id):
+        return {**self.escalation, **self.cameras.get(cam_id, {})}
+
+    def find_ambiguous_slots(self, cam_id, detections, thresholds):
+        """
+        Места, по которым быстрая модель не даёт уверенного ответа.
+        :param detections: детекции в координатах кадра
+        :return: список координат [x1, y1, x2, y2] сомнительных мест в координатах кадра
+        """
+        iou_threshold = self.zone_manager.iou_threshold
+        scale = self.zone_manager.get_frame_scale(cam_id)
+        detections = rescale_detections(detections, 1.0 / scale)
+        geometry = self.zone_manager.get_geometry(cam_id)
+
+        iou = geometry.iou_matrix(detections)  # (места, детекции)
+        best_iou = iou.max(axis=1) if iou.shape[1] else np.zeros(iou.shape[0], dtype=np.float32)
+        confs = np.array([det[5] for det in detections], dtype=np.float32)
+        uncertain = (confs >= thresholds["conf_low"]) & (confs < thresholds["conf_high"])
+        uncertain_overlap = ((iou > 0) & uncertain[None, :]).any(axis=1)
+        near_threshold = np.abs(best_iou - iou_threshold) <= thresholds["iou_margin"]
+
+        zones = geometry.zones
+        return [scale_box(zones[geometry.slot_ids[i]]["coords"], scale)
+                for i in np.flatnonzero(uncertain_overlap | near_threshold)]
+
+    def _crop_region(self, frame, boxes, padding):
+        h, w = frame.shape[:2]
+        x1 = min(b[0] for b in boxes)
+        y1 = min(b[1] for b in boxes)
+        x2 = max(b[2] for b in boxes)
+        y2 = max(b[3] for b in boxes)
+        pad_x, pad_y = int((x2 - x1) * padding), int((y2 - y1) * padding)
+        return (int(clamp(x1 - pad_x, 0, w)), int(clamp(y1 - pad_y, 0, h)),
+                int(clamp(x2 + pad_x, 0, w)), int(clamp(y2 + pad_y, 0, h)))
+
+    def _escalate_crop(self, frame, cam_id, detections, ambiguous, padding):
+        rx1, ry1, rx2, ry2 = self._crop_region(frame, ambiguous, padding)
+        if rx2 <= rx1 or ry2 <= ry1:
+            return detections
+
+        crop_dets = self.accurate_detector.detect(frame[ry1:ry2, rx1:rx2], cam_id=cam_id)
+        refined = [(x1 + rx1, y1 + ry1, x2 + rx1, y2 + ry1, cls_id, conf)
+                   for x1, y1, x2, y2, cls_id, conf in crop_dets]
+
+        # Детекции быстрой модели внутри области заменяются результатами точной
+        for det in detections:
+            cx, cy = (det[0] + det[2]) / 2, (det[1] + det[3]) / 2
+            if not (rx1 <= cx < rx2 and ry1 <= cy < ry2):
+                refined.append(det)
+        return refined
+
+    def detect(self, frame, cam_id=None, imgsz=None):
+        thresholds = self.get_thresholds(cam_id)
+        detections = self.fast_detector.detect(frame, cam_id=cam_id, imgsz=imgsz)
+        self.frames[cam_id] += 1
+
+        ambiguous = self.find_ambiguous_slots(cam_id, detections, thresholds)
+        if not ambiguous:
+            return detections
+
+        self.escalations[cam_id] += 1
+        logger.debug(f"[Cascade] {cam_id}: escalating {len(ambiguous)} ambiguous slots")
+
+        if thresholds["mode"] == "frame":
+            return self.accurate_detector.detect(frame, cam_id=cam_id, imgsz=imgsz)
+        return self._escalate_crop(frame, cam_id, detections, ambiguous, thresholds["padding"])
+
+    def get_stats(self):
+        """
+        Доля кадров, на которых запускалась точная модель.
+        :return: dict {cam_id: {"frames": int, "escalations": int, "escalation_rate": float}}
+        """
+        return {
+            cam_id: {
+                "frames": frames,
+                "escalations": self.escalations[cam_id],
+                "escalation_rate": self.escalations[cam_id] / frames if frames else 0.0,
+            }
+            for cam_id, frames in self.frames.items()
+        }
+
+    def attach_stream(self, cam_id, stream):
+        """Передаёт поток камеры обеим моделям, если они его используют (детектор-заглушка)."""
+        for detector in (self.fast_detector, self.accurate_detector):
+            attach = getattr(detector, "attach_stream", None)
+            if attach:
+                attach(cam_id, stream)
+
+    def drop_camera(self, cam_id):
+        """Забывает счётчики камеры, которая больше не обрабатывается (и её состояние в моделях)."""
+        self.frames.pop(cam_id, None)
+        self.escalations.pop(cam_id, None)
+        for detector in (self.fast_detector, self.accurate_detector):
+            drop = getattr(detector, "drop_camera", None)
+            if drop:
+                drop(cam_id)
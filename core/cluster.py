@@ -0,0 +1,261 @@
+import json
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger("Cluster")
+
+"""
+Шардирование камер по нескольким узлам.
+
+    worker     — обрабатывает свои камеры (cluster.nodes[node]) и отправляет изменения статусов мест
+    aggregator — принимает изменения от всех worker-ов и сводит их в GlobalAggregator с учётом trust
+
+Протокол: TCP, одно JSON-сообщение на строку.
+    {"type": "hello", "node": "node1", "cameras": ["cam1", "cam4"]}
+    {"type": "updates", "node": "node1", "seq": 42, "updates": [["cam1", "00001", true], ["cam1", "00007", null], ...]}
+    {"type": "updates", "node": "node1", "seq": 43, "full": true, "updates": [...]}
+    {"type": "heartbeat", "node": "node1", "cameras": ["cam1"]}
+null — место удалено из разметки камеры (или камера давно молчит).
+heartbeat отправляется периодически: камеры узла живы, даже если их статусы не меняются,
+и их отчёты на агрегаторе не устаревают.
+После (пере)подключения worker отправляет полное состояние своих камер (full: true), затем только изменения.
+Полное состояние заменяет отчёты камер узла: места, которых в нём нет, удаляются — так доходят удаления
+из пакета, потерянного при обрыве соединения.
+Если узел отключился и не переподключился за disconnect_grace секунд, агрегатор удаляет отчёты его камер.
+"""
+
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+
+def encode_message(message):
+    return (json.dumps(message, separators=(",", ":"), ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def cameras_for_node(nodes_cfg, node):
+    """
+    :param nodes_cfg: dict {node: [cam_id, ...]} из cluster.nodes
+    :return: список камер узла
+    """
+    if node not in nodes_cfg:
+        raise ValueError(f"Node '{node}' is not defined in cluster.nodes")
+    return list(nodes_cfg[node])
+
+
+class ClusterWorker:
+    def __init__(self, node, cameras, host="127.0.0.1", port=8765, batch_interval=0.2, reconnect_delay=2.0,
+                 heartbeat_interval=5.0):
+        """
+        Отправка изменений статусов мест с worker-узла на агрегатор.
+
+        :param node: имя узла
+        :param cameras: список камер узла (для hello-сообщения)
+        :param host: адрес агрегатора
+        :param port: порт агрегатора
+        :param batch_interval: как часто (сек) отправлять накопленные изменения одним сообщением
+        :param reconnect_delay: пауза между попытками подключения
+        :param heartbeat_interval: как часто подтверждать, что камеры живы, если изменений нет
+        """
+        self.node = node
+        self.cameras = list(cameras)
+        self.host = host
+        self.port = port
+        self.batch_interval = batch_interval
+        self.reconnect_delay = reconnect_delay
+        self.heartbeat_interval = heartbeat_interval
+        self.aggregator = None
+        self.last_heartbeat = 0.0
+
+        self.state = {}  # (cam_id, slot_id) → bool — последнее известное значение
+        self.pending = {}  # (cam_id, slot_id) → bool — ещё не отправленные изменения
+        self.seq = 0
+        self.sent_updates = 0
+
+    def attach(self, aggregator):
+        """
+        Подписывается на изменения локального GlobalAggregator. Уже известные отчёты своих камер
+        (например, восстановленные из снимка) сразу попадают в полное состояние узла.
+        """
+        self.aggregator = aggregator
+        for slot_id, reports in aggregator.get_state().items():
+            for cam_id, is_free in reports.items():
+                if cam_id in self.cameras:
+                    self.state[(cam_id, slot_id)] = is_free
+        aggregator.add_listener(self.on_update)
+
+    def on_update(self, cam_id, changed):
+        """Слушатель GlobalAggregator.add_listener: копит изменения до следующей отправки."""
+        for slot_id, is_free in changed.items():
+            if is_free is None:
+                self.state.pop((cam_id, slot_id), None)
+            else:
+                self.state[(cam_id, slot_id)] = is_free
+            self.pending[(cam_id, slot_id)] = is_free
+
+    def _build_batch(self, entries, full=False):
+        self.seq += 1
+        batch = {
+            "type": "updates",
+            "node": self.node,
+            "seq": self.seq,
+            "updates": [[cam_id, slot_id, is_free] for (cam_id, slot_id), is_free in entries.items()],
+        }
+        if full:
+            batch["full"] = True
+        return batch
+
+    async def _send(self, writer, entries, full=False):
+        writer.write(encode_message(self._build_batch(entries, full=full)))
+        await writer.drain()
+        self.sent_updates += len(entries)
+
+    async def _send_heartbeat(self, writer):
+        # Только камеры, которые ещё отчитываются локально: отчёты остановившихся камер должны устареть
+        alive = [cam_id for cam_id in self.cameras if self.aggregator and cam_id in self.aggregator.last_seen]
+        writer.write(encode_message({"type": "heartbeat", "node": self.node, "cameras": alive}))
+        await writer.drain()
+        self.last_heartbeat = time.monotonic()
+
+    async def _session(self, stop_event):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        logger.info(f"[Cluster] Worker {self.node} connected to {self.host}:{self.port}")
+        try:
+            writer.write(encode_message({"type": "hello", "node": self.node, "cameras": self.cameras}))
+            # Агрегатор мог перезапуститься, а пакет, отправленный перед обрывом, — потеряться:
+            # полное состояние отправляется всегда, даже пустое — агрегатор удалит всё, чего в нём нет
+            full = {key: None for key, is_free in self.pending.items() if is_free is None}
+            full.update(self.state)
+            self.pending.clear()
+            await self._send(writer, full, full=True)
+
+            while not stop_event.is_set():
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=self.batch_interval)
+                except asyncio.TimeoutError:
+                    pass
+                if self.pending:
+                    batch, self.pending = self.pending, {}
+                    await self._send(writer, batch)
+                if time.monotonic() - self.last_heartbeat >= self.heartbeat_interval:
+                    await self._send_heartbeat(writer)
+        finally:
+            writer.close()
+
+    async def run(self, stop_event):
+        while not stop_event.is_set():
+            try:
+                await self._session(stop_event)
+            except (ConnectionError, OSError) as e:
+                logger.warning(f"[Cluster] Worker {self.node}: aggregator unavailable ({e}), "
+                               f"retrying in {self.reconnect_delay}s")
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=self.reconnect_delay)
+                except asyncio.TimeoutError:
+                    pass
+
+
+class ClusterAggregatorServer:
+    def __init__(self, aggregator, host="0.0.0.0", port=8765, disconnect_grace=10.0):
+        """
+        Приём изменений от worker-узлов и слияние в GlobalAggregator.
+
+        :param aggregator: экземпляр GlobalAggregator (trust берётся из его ZoneManager)
+        :param disconnect_grace: сколько секунд ждать переподключения узла, прежде чем удалить отчёты его камер
+        """
+        self.aggregator = aggregator
+        self.host = host
+        self.port = port
+        self.disconnect_grace = disconnect_grace
+        self.nodes = {}  # node → {"cameras": [...], "reported": set(cam_id), "last_seq": int, "connection": writer}
+        self.received_updates = 0
+
+    def _new_node(self, cameras=(), connection=None):
+        return {"cameras": list(cameras), "reported": set(), "last_seq": 0, "connection": connection}
+
+    def drop_node(self, node, connection=None):
+        """
+        Удаляет отчёты всех камер узла (узел отключился). Если connection задан, а узел уже
+        переподключился другим соединением, ничего не делает.
+        :return: список камер, чьи отчёты удалены
+        """
+        info = self.nodes.get(node)
+        if info is None or (connection is not None and info["connection"] is not connection):
+            return []
+        del self.nodes[node]
+        cameras = set(info["cameras"]) | info["reported"]
+        for cam_id in cameras:
+            self.aggregator.last_seen.pop(cam_id, None)
+            self.aggregator.drop_reports(cam_id, [slot_id for slot_id, reports in self.aggregator.status_reports.items()
+                                                  if cam_id in reports])
+        logger.warning(f"[Cluster] Node {node} is gone, dropped reports of cameras {sorted(cameras)}")
+        return sorted(cameras)
+
+    def apply(self, message):
+        by_camera, removed = {}, {}
+        for cam_id, slot_id, is_free in message.get("updates", []):
+            if is_free is None:
+                removed.setdefault(cam_id, []).append(slot_id)
+            else:
+                by_camera.setdefault(cam_id, {})[slot_id] = bool(is_free)
+        info = self.nodes.get(message.get("node"))
+        if message.get("full") and info:
+            # Полное состояние узла: отчёты его камер о местах, которых в нём нет, устарели
+            for cam_id in set(info["cameras"]) | info["reported"]:
+                known = by_camera.get(cam_id, {})
+                stale = [slot_id for slot_id, reports in self.aggregator.status_reports.items()
+                         if cam_id in reports and slot_id not in known]
+                if stale:
+                    removed.setdefault(cam_id, []).extend(stale)
+        for cam_id, statuses in by_camera.items():
+            self.aggregator.update(cam_id, statuses)
+        for cam_id, slot_ids in removed.items():
+            self.aggregator.drop_reports(cam_id, slot_ids)
+
+        node = self.nodes.setdefault(message.get("node"), self._new_node())
+        node["reported"].update(by_camera)
+        node["last_seq"] = message.get("seq", node["last_seq"])
+        self.received_updates += len(message.get("updates", []))
+
+    async def _handle(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        node = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"[Cluster] Malformed message from {peer}, skipping")
+                    continue
+
+                if message.get("type") == "hello":
+                    node = message.get("node")
+                    previous = self.nodes.get(node)
+                    self.nodes[node] = self._new_node(message.get("cameras", []), connection=writer)
+                    if previous:
+                        # Переподключение: камеры, о которых узел больше не сообщает, удалятся при его отключении
+                        self.nodes[node]["reported"] = previous["reported"]
+                    logger.info(f"[Cluster] Node {node} connected from {peer}: cameras {self.nodes[node]['cameras']}")
+                elif message.get("type") == "updates":
+                    self.apply(message)
+                elif message.get("type") == "heartbeat":
+                    self.aggregator.touch(message.get("cameras", []))
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            logger.warning(f"[Cluster] Connection error from {node or peer}: {e}")
+        finally:
+            logger.warning(f"[Cluster] Node {node or peer} disconnected")
+            writer.close()
+            if node is not None:
+                if self.disconnect_grace > 0:
+                    asyncio.get_running_loop().call_later(self.disconnect_grace, self.drop_node, node, writer)
+                else:
+                    self.drop_node(node, writer)
+
+    async def run(self, stop_event):
+        # Полное состояние узла приходит одной строкой — лимит буфера с запасом на тысячи мест
+        server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_MESSAGE_SIZE)
+        logger.info(f"[Cluster] Aggregator listening on {self.host}:{self.port}")
+        async with server:
+            await stop_event.wait()
@@ -0,0 +1,112 @@
+import time
+import logging
+from collections import OrderedDict, defaultdict
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger("DetectionCache")
+
+
+class DetectionCache:
+    def __init__(self, detector, hash_size=16, tolerance=6, ttl_seconds=10.0, max_entries=32):
+        """
+        LRU-кэш детекций перед детектором для статичных сцен (ночь, закрытый паркинг).
+
+        :param detector: экземпляр ObjectDetector (или любой объект с методом detect)
+        :param hash_size: размер перцептивного хэша (hash_size x hash_size бит)
+        :param tolerance: максимальное расстояние Хэмминга между хэшами, при котором кадры считаются одинаковыми
+        :param ttl_seconds: время жизни записи в кэше, после него детекция выполняется заново
+        :param max_entries: максимальное число записей на одну камеру
+        """
+        self.detector = detector
+        self.hash_size = hash_size
+        self.tolerance = tolerance
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries = defaultdict(OrderedDict)  # cam_id → {hash: (timestamp, detections)}
+        self.hits = defaultdict(int)  # cam_id → число попаданий
+        self.misses = defaultdict(int)  # cam_id → число промахов
+
+    def frame_hash(self, frame):
+        """
+        dHash уменьшенного кадра в оттенках серого.
+        :param frame: numpy.ndarray — кадр BGR (уже после CLAHE)
+        :return: int — битовая маска размером hash_size * hash_size
+        """
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        small = cv2.resize(gray, (self.hash_size + 1, self.hash_size), interpolation=cv2.INTER_AREA)
+        diff = small[:, 1:] > small[:, :-1]
+        return int.from_bytes(np.packbits(diff).tobytes(), "big")
+
+    def _lookup(self, cam_id, key, now):
+        entries = self.entries[cam_id]
+        for cached_key in list(entries.keys()):
+            timestamp, detections = entries[cached_key]
+            if now - timestamp > self.ttl_seconds:
+                del entries[cached_key]
+                continue
+            if bin(cached_key ^ key).count("1") <= self.tolerance:
+                entries.move_to_end(cached_key)
+                return detections
+        return None
+
+    def _store(self, cam_id, key, detections, now):
+        entries = self.entries[cam_id]
+        entries[key] = (now, detections)
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def detect(self, frame, cam_id=None, imgsz=None):
+        """
+        Возвращает детекции из кэша, если похожий кадр этой камеры уже обрабатывался,
+        иначе вызывает детектор и сохраняет результат.
+        """
+        now = time.time()
+        key = self.frame_hash(frame)
+
+        detections = self._lookup(cam_id, key, now)
+        if detections is not None:
+            self.hits[cam_id] += 1
+            return detections
+
+        self.misses[cam_id] += 1
+        detections = self.detector.detect(frame, cam_id=cam_id, imgsz=imgsz)
+        self._store(cam_id, key, detections, now)
+        return detections
+
+    def get_stats(self):
+        """
+        Статистика кэша по камерам.
+        :return: dict {cam_id: {"hits": int, "misses": int, "hit_ratio": float}}
+        """
+        stats = {}
+        for cam_id in set(self.hits) | set(self.misses):
+            hits, misses = self.hits[cam_id], self.misses[cam_id]
+            total = hits + misses
+            stats[cam_id] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": hits / total if total else 0.0,
+            }
+        return stats
+
+    def attach_stream(self, cam_id, stream):
+        """Передаёт поток камеры детектору за кэшем, если он его использует (детектор-заглушка)."""
+        attach_inner = getattr(self.detector, "attach_stream", None)
+        if attach_inner:
+            attach_inner(cam_id, stream)
+
+    def drop_camera(self, cam_id):
+        """Забывает записи и счётчики камеры, которая больше не обрабатывается (и состояние детектора за кэшем)."""
+        for state in (self.entries, self.hits, self.misses):
+            state.pop(cam_id, None)
+        drop_inner = getattr(self.detector, "drop_camera", None)
+        if drop_inner:
+            drop_inner(cam_id)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits.clear()
+        self.misses.clear()
@@ -1,5 +1,8 @@
+import time
 import logging
-from ultralytics import YOLO
+import threading
+
+import numpy as np
 
 # COCO-классы для транспорта
 DEFAULT_CLASSES = {
@@ -9,6 +12,29 @@ DEFAULT_CLASSES = {
     7: "truck"
 }
 
+# Общий для процесса кэш моделей: path → YOLO. Модель грузится один раз,
+# сколько бы ObjectDetector ни создали main.py, ParkingCalibrator или ManualSlotMarker.
+_MODEL_CACHE = {}
+_WARMED_UP = set()
+_MODEL_LOCK = threading.Lock()
+
+
+def load_model(model_path):
+    """
+    Возвращает YOLO-модель из кэша процесса, при первом обращении загружает её.
+    ultralytics (и torch) импортируются только здесь, а не при импорте модуля.
+    """
+    with _MODEL_LOCK:
+        model = _MODEL_CACHE.get(model_path)
+        if model is None:
+            start = time.perf_counter()
+            from ultralytics import YOLO
+            model = YOLO(model_path)
+            _MODEL_CACHE[model_path] = model
+            logging.info(f"[Detector] YOLOv8 model loaded: {model_path} ({time.perf_counter() - start:.2f}s)")
+        return model
+
+
 class ObjectDetector:
     def __init__(self, model_path: str, conf_threshold: float = 0.3, allowed_classes=None):
         """
@@ -16,22 +42,57 @@ class ObjectDetector:
         :param conf_threshold: минимальный порог уверенности
         :param allowed_classes: словарь {int: str} — допустимые классы объектов
         """
-        self.model = YOLO(model_path)
+        self.model_path = model_path
+        self.model = load_model(model_path)
         self.conf_threshold = conf_threshold
         self.allowed_classes = allowed_classes or DEFAULT_CLASSES
 
-        logging.info(f"[Detector] YOLOv8 model loaded: {model_path}")
         logging.info(f"[Detector] Allowed classes: {self.allowed_classes}")
 
-    def detect(self, frame):
+    def warmup(self, shape=(640, 640, 3)):
+        """
+        Прогревочный инференс на пустом кадре: инициализация графа и выделение памяти
+        происходят при старте, а не на первых кадрах камер. Выполняется один раз на модель.
+        """
+        with _MODEL_LOCK:
+            if self.model_path in _WARMED_UP:
+                return
+            _WARMED_UP.add(self.model_path)
+
+        start = time.perf_counter()
+        self.model(np.zeros(shape, dtype=np.uint8), verbose=False)
+        logging.info(f"[Detector] Warm-up for {self.model_path}: {time.perf_counter() - start:.2f}s")
+
+    def detect(self, frame, cam_id=None, imgsz=None):
         """
         Детектирует объекты на кадре и фильтрует по классам транспорта.
 
         :param frame: numpy.ndarray — изображение
+        :param cam_id: идентификатор камеры (используется обёртками вроде DetectionCache)
+        :param imgsz: размер входа модели (None — по умолчанию для модели)
         :return: список детекций в формате:
                  [(x1, y1, x2, y2, class_id, confidence), ...]
         """
-        results = self.model(frame, verbose=False)[0]
+        kwargs = {"imgsz": imgsz} if imgsz else {}
+        results = self.model(frame, verbose=False, **kwargs)[0]
+        detections = self._parse(results)
+        logging.debug(f"[Detector] {len(detections)} valid objects detected")
+        return detections
+
+    def detect_batch(self, frames, imgsz=None):
+        """
+        Детекция на пачке кадров одним вызовом модели — дешевле покадровых вызовов при калибровке.
+
+        :param frames: список numpy.ndarray
+        :param imgsz: размер входа модели (None — по умолчанию для модели)
+        :return: список списков детекций — по одному на кадр, формат как у detect
+        """
+        if not frames:
+            return []
+        kwargs = {"imgsz": imgsz} if imgsz else {}
+        return [self._parse(results) for results in self.model(list(frames), verbose=False, **kwargs)]
+
+    def _parse(self, results):
         detections = []
 
         for box in results.boxes:
@@ -47,5 +108,4 @@ class ObjectDetector:
             x1, y1, x2, y2 = map(int, box.xyxy[0])
             detections.append((x1, y1, x2, y2, class_id, confidence))
 
-        logging.debug(f"[Detector] {len(detections)} valid objects detected")
-        return detections
\ No newline at end of file
+        return detections
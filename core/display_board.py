@@ -1,23 +1,28 @@
 import cv2
 import numpy as np
 from math import ceil
-import asyncio
+import threading
+
+
+def _camera_order(cam_id):
+    return int(''.join(filter(str.isdigit, cam_id)) or 0)
+
 
 class DisplayBoard:
     def __init__(self, width=1280, height=720, max_columns=2, tiles_per_page=4):
-        self.frames = {}  # cam_id -> frame
+        # cam_id -> миниатюра размера плитки (None — камера не на текущей странице).
+        # Полные кадры не хранятся: память доски не зависит от разрешения камер
+        self.frames = {}
         self.width = width
         self.height = height
         self.max_columns = max_columns
         self.tiles_per_page = tiles_per_page
         self.current_page = 0
-        self.lock = asyncio.Lock()
+        self.lock = threading.Lock()  # update_frame — из цикла событий, render — из потока отображения
 
     def render(self):
-        def sort_key(cam_id):
-            return int(''.join(filter(str.isdigit, cam_id)) or 0)
-
-        cams = sorted(self.frames.keys(), key=sort_key)
+        with self.lock:
+            cams = sorted(self.frames.keys(), key=_camera_order)
         N = len(cams)
         if N == 0:
             return
@@ -39,21 +44,12 @@ class DisplayBoard:
             row = idx // cols
             col = idx % cols
 
-            frame = self.frames.get(cam_id)
-            if frame is None:
-                continue
-
-            resized = cv2.resize(frame, (tile_w, tile_h))
-
-            label = f"{cam_id}"
-            cv2.putText(resized, label, (10, 30),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 3, cv2.LINE_AA)
-            cv2.putText(resized, label, (10, 30),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 255), 1, cv2.LINE_AA)
-
             y1, y2 = row * tile_h, (row + 1) * tile_h
             x1, x2 = col * tile_w, (col + 1) * tile_w
-            canvas[y1:y2, x1:x2] = resized
+            with self.lock:
+                thumbnail = self.frames.get(cam_id)
+                if thumbnail is not None:
+                    canvas[y1:y2, x1:x2] = thumbnail
 
         cv2.putText(canvas, f"Page {self.current_page + 1}/{total_pages}",
                     (10, self.height - 10),
@@ -62,14 +58,54 @@ class DisplayBoard:
         cv2.imshow("All Cameras", canvas)
 
 
+    @property
+    def tile_size(self):
+        return self.width // self.max_columns, self.height // (self.tiles_per_page // self.max_columns)
+
+    def _visible(self, cam_id, cams):
+        index = sorted(cams, key=_camera_order).index(cam_id)
+        return index // self.tiles_per_page == self.current_page
+
     def update_frame(self, cam_id, frame):
-        self.frames[cam_id] = frame
+        """
+        Кадр сразу уменьшается до миниатюры (только для камер текущей страницы), ссылка на него не сохраняется.
+        :param frame: кадр камеры
+        """
+        with self.lock:
+            thumbnail = self.frames.get(cam_id)
+            cams = set(self.frames) | {cam_id}
+            if not self._visible(cam_id, cams):
+                self.frames[cam_id] = None
+                return
+            tile_w, tile_h = self.tile_size
+            if thumbnail is None:
+                thumbnail = np.empty((tile_h, tile_w, 3), dtype=np.uint8)
+            cv2.resize(frame, (tile_w, tile_h), dst=thumbnail, interpolation=cv2.INTER_AREA)
+
+            label = f"{cam_id}"
+            cv2.putText(thumbnail, label, (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 3, cv2.LINE_AA)
+            cv2.putText(thumbnail, label, (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 255), 1, cv2.LINE_AA)
+            self.frames[cam_id] = thumbnail
+
+    def remove_frame(self, cam_id):
+        with self.lock:
+            self.frames.pop(cam_id, None)
+
+    def _drop_thumbnails(self):
+        # Миниатюры прошлой страницы больше не нужны — новые появятся со следующими кадрами
+        with self.lock:
+            for cam_id in self.frames:
+                self.frames[cam_id] = None
 
     def next_page(self):
         total_pages = ceil(len(self.frames) / self.tiles_per_page)
         if self.current_page < total_pages - 1:
             self.current_page += 1
+            self._drop_thumbnails()
 
     def prev_page(self):
         if self.current_page > 0:
-            self.current_page -= 1
\ No newline at end of file
+            self.current_page -= 1
+            self._drop_thumbnails()
\ No newline at end of file
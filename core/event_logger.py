@@ -8,16 +8,28 @@ from logging.handlers import RotatingFileHandler
 
 event_logger = logging.getLogger("EventLogger")
 log_path = Path("logs/slot_events.log")
-log_path.parent.mkdir(parents=True, exist_ok=True)
 
-handler = RotatingFileHandler(log_path, maxBytes=1_000_000, backupCount=5)
-formatter = logging.Formatter('%(asctime)s - %(message)s')
-handler.setFormatter(formatter)
-event_logger.setLevel(logging.INFO)
-event_logger.addHandler(handler)
+
+def _get_event_logger():
+    """
+    Файловый обработчик создаётся при первом событии, а не при импорте,
+    и ровно один раз — повторные вызовы не добавляют обработчики.
+    """
+    if not event_logger.handlers:
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(log_path, maxBytes=1_000_000, backupCount=5)
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+        event_logger.setLevel(logging.INFO)
+        event_logger.addHandler(handler)
+    return event_logger
 
 
 def log_slot_event(cam_id, slot_id, old_status, new_status, frame, roi_coords):
+    """
+    Сохраняет кадр, ROI места и метаданные смены статуса.
+    :param frame: кадр без разметки — ROI используются как обучающие данные tools/train_roi_classifier.py
+    :param roi_coords: [x1, y1, x2, y2] в координатах кадра
+    """
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     status_str = f"{'Free' if old_status else 'Occupied'} -> {'Free' if new_status else 'Occupied'}"
 
@@ -51,4 +63,4 @@ def log_slot_event(cam_id, slot_id, old_status, new_status, frame, roi_coords):
     with open(meta_path, "w", encoding="utf-8") as f:
         json.dump(meta, f, indent=2)
 
-    event_logger.info(f"[{cam_id}] {slot_id} status changed: {status_str} — saved to {event_dir}")
+    _get_event_logger().info(f"[{cam_id}] {slot_id} status changed: {status_str} — saved to {event_dir}")
@@ -0,0 +1,194 @@
+import os
+import json
+import logging
+import threading
+import subprocess
+from collections import deque
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger("FFmpegCapture")
+
+"""
+Декодирование через ffmpeg в подпроцессе с чтением сырых BGR-кадров из pipe.
+
+В отличие от cv2.VideoCapture масштабирование и конвертация в BGR выполняются внутри ffmpeg
+(swscale), а лишние кадры отбрасываются до конвертации:
+    width           — ширина выходного кадра (уменьшение в декодере, высота — с сохранением пропорций)
+    fps             — прореживание до fps кадров в секунду
+    keyframes_only  — декодировать только ключевые кадры (-skip_frame nokey): остальные даже не декодируются
+    threads         — потоки декодера (0 — автоматически)
+"""
+
+DEFAULT_OPTIONS = {
+    "backend": "opencv",
+    "width": None,
+    "fps": None,
+    "keyframes_only": False,
+    "threads": 0,
+    "binary": "ffmpeg",
+    "probe_binary": "ffprobe",
+}
+
+
+def decoder_options(cfg, cam_id=None):
+    """
+    :param cfg: секция decoder из config.yaml (dict / DictConfig)
+    :param cam_id: идентификатор камеры — учитываются переопределения из cfg.cameras
+    :return: dict параметров декодера
+    """
+    cfg = dict(cfg or {})
+    overrides = dict((cfg.pop("cameras", None) or {}).get(cam_id, None) or {})
+    return {**DEFAULT_OPTIONS, **cfg, **overrides}
+
+
+def probe_stream(source, probe_binary="ffprobe", timeout=15.0):
+    """
+    :return: dict {"width", "height", "fps"} первого видеопотока или None
+    """
+    cmd = [probe_binary, "-v", "error", "-select_streams", "v:0",
+           "-show_entries", "stream=width,height,avg_frame_rate", "-of", "json", source]
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=timeout, check=True)
+        stream = json.loads(result.stdout)["streams"][0]
+    except (OSError, subprocess.SubprocessError, ValueError, KeyError, IndexError) as e:
+        logger.warning(f"[FFmpegCapture] Failed to probe {source}: {e}")
+        return None
+
+    num, _, den = str(stream.get("avg_frame_rate", "0/1")).partition("/")
+    fps = float(num) / float(den or 1) if float(den or 1) else 0.0
+    return {"width": int(stream["width"]), "height": int(stream["height"]), "fps": fps}
+
+
+class FFmpegCapture:
+    def __init__(self, source, width=None, fps=None, keyframes_only=False, threads=0,
+                 binary="ffmpeg", probe_binary="ffprobe", **_ignored):
+        """
+        Замена cv2.VideoCapture (тот же минимальный интерфейс), читающая кадры из ffmpeg.
+
+        :param source: путь к видео или URL потока
+        :param width: ширина выходного кадра (None — исходная)
+        :param fps: прореживание до fps кадров в секунду (None — все кадры)
+        :param keyframes_only: декодировать только ключевые кадры
+        :param threads: число потоков декодера (0 — автоматически)
+        """
+        self.source = source
+        self.is_file = os.path.isfile(str(source))  # EOF файла — конец видео, EOF потока — обрыв связи
+        self.binary = binary
+        self.index = 0
+        self.eof = False
+        self.process = None
+        self.stderr_tail = deque(maxlen=20)  # последние строки stderr ffmpeg — для диагностики
+
+        info = probe_stream(source, probe_binary)
+        if info is None:
+            return
+        self.src_width, self.src_height = info["width"], info["height"]
+        self.src_fps = info["fps"]
+
+        self.width, self.height = self.src_width, self.src_height
+        if width and width < self.src_width:
+            self.width = int(width) // 2 * 2  # swscale и большинство пиксельных форматов требуют чётных размеров
+            self.height = max(2, int(round(self.src_height * self.width / self.src_width)) // 2 * 2)
+        self.scale = self.width / self.src_width  # масштаб выдаваемых кадров относительно исходного разрешения
+        self.fps = fps or self.src_fps
+        self.frame_bytes = self.width * self.height * 3
+
+        filters = []
+        if fps:
+            filters.append(f"fps={fps}")
+        if (self.width, self.height) != (self.src_width, self.src_height):
+            filters.append(f"scale={self.width}:{self.height}:flags=area")
+
+        cmd = [binary, "-hide_banner", "-loglevel", "error", "-nostdin", "-threads", str(threads)]
+        if keyframes_only:
+            cmd += ["-skip_frame", "nokey"]
+        if str(source).startswith("rtsp://"):
+            cmd += ["-rtsp_transport", "tcp"]
+        cmd += ["-i", str(source), "-an", "-sn", "-dn"]
+        if keyframes_only:
+            cmd += ["-vsync", "0"]  # не дублировать ключевые кадры до исходной частоты
+        if filters:
+            cmd += ["-vf", ",".join(filters)]
+        cmd += ["-pix_fmt", "bgr24", "-f", "rawvideo", "pipe:1"]
+
+        try:
+            self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                            bufsize=self.frame_bytes)
+        except OSError as e:
+            logger.warning(f"[FFmpegCapture] Failed to start {binary}: {e}")
+            self.process = None
+            return
+        # stderr вычитывается постоянно: иначе поток ошибок декодирования (битый RTSP) заполнит pipe и ffmpeg встанет
+        threading.Thread(target=self._drain_stderr, args=(self.process.stderr,), daemon=True).start()
+        logger.info(f"[FFmpegCapture] {source}: {self.src_width}x{self.src_height} → {self.width}x{self.height}"
+                    f"{f', {fps} fps' if fps else ''}{', keyframes only' if keyframes_only else ''}")
+
+    def isOpened(self):
+        return self.process is not None
+
+    def read(self, image=None):
+        """
+        :param image: буфер (height, width, 3) uint8 — заполняется на месте, если подходит по размеру
+        :return: (bool, numpy.ndarray)
+        """
+        if self.process is None or self.eof:
+            return False, None
+        shape = (self.height, self.width, 3)
+        if image is None or image.shape != shape or image.dtype != np.uint8 or not image.flags.c_contiguous:
+            image = np.empty(shape, dtype=np.uint8)
+
+        view = memoryview(image).cast("B")
+        filled = 0
+        while filled < self.frame_bytes:
+            n = self.process.stdout.readinto(view[filled:])
+            if not n:
+                self._on_eof()
+                return False, None
+            filled += n
+        self.index += 1
+        return True, image
+
+    def grab(self):
+        ok, _ = self.read()
+        return ok
+
+    def _drain_stderr(self, stream):
+        for line in iter(stream.readline, b""):
+            self.stderr_tail.append(line.decode("utf-8", "replace").strip())
+
+    def _on_eof(self):
+        self.eof = True
+        try:
+            returncode = self.process.wait(timeout=1.0)
+        except subprocess.TimeoutExpired:
+            return
+        if returncode:
+            logger.warning(f"[FFmpegCapture] {self.binary} exited with code {returncode}"
+                           f"{': ' + self.stderr_tail[-1] if self.stderr_tail else ''}")
+
+    def get(self, prop):
+        if self.process is None:
+            return 0.0
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.index)
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            # После прореживания число кадров заранее неизвестно — конец файла определяется по EOF
+            return float(self.index) if self.eof and self.is_file else 0.0
+        return 0.0
+
+    def release(self):
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.process.stdout.close()
+        self.process = None
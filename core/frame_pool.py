@@ -0,0 +1,70 @@
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger("FramePool")
+
+
+class FramePool:
+    def __init__(self, max_free=4):
+        """
+        Пул переиспользуемых буферов кадров одной камеры.
+
+        Владение явное: acquire выдаёт буфер со счётчиком ссылок 1, владелец (цикл камеры) отпускает его
+        через release в конце итерации. Все текущие потребители кадра работают с ним синхронно внутри
+        итерации и ссылок не сохраняют: детектор и анализ, запись событий, VideoWriter, DisplayBoard
+        (сразу уменьшает кадр в собственную миниатюру). Потребитель, которому кадр понадобится дольше
+        итерации (например, другому потоку), должен вызвать retain и затем release: буфер возвращается
+        в пул только когда его отпустили все, поэтому запись следующего кадра не попадёт в массив,
+        который ещё читают.
+
+        :param max_free: сколько свободных буферов держать; лишние при освобождении отдаются сборщику мусора
+        """
+        self.max_free = max_free
+        self.free = []
+        self.refs = {}  # id(buffer) → [buffer, счётчик ссылок]
+        self.allocated = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, shape, dtype=np.uint8):
+        """:return: numpy.ndarray формы shape, принадлежащий вызывающему (счётчик ссылок 1)"""
+        shape = tuple(shape)
+        with self.lock:
+            buf = None
+            while self.free:
+                candidate = self.free.pop()
+                if candidate.shape == shape and candidate.dtype == dtype:
+                    buf = candidate
+                    break
+                # Размер кадра сменился — старые буферы больше не нужны
+            if buf is None:
+                buf = np.empty(shape, dtype=dtype)
+                self.allocated += 1
+            self.refs[id(buf)] = [buf, 1]
+            return buf
+
+    def owns(self, buf):
+        with self.lock:
+            return id(buf) in self.refs
+
+    def retain(self, buf):
+        with self.lock:
+            self.refs[id(buf)][1] += 1
+        return buf
+
+    def release(self, buf):
+        with self.lock:
+            entry = self.refs.get(id(buf))
+            if entry is None or entry[0] is not buf:
+                raise ValueError("Buffer does not belong to this pool or was already released")
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            del self.refs[id(buf)]
+            if len(self.free) < self.max_free:
+                self.free.append(buf)
+
+    def get_stats(self):
+        with self.lock:
+            return {"allocated": self.allocated, "in_use": len(self.refs), "free": len(self.free)}
@@ -2,44 +2,115 @@ import time
 from collections import defaultdict, deque
 
 class OccupancyAnalyzer:
-    def __init__(self, zone_manager, window_seconds=2.0, min_confirmations=3):
+    def __init__(self, zone_manager, window_seconds=2.0, min_confirmations=3, incremental=False, tolerance_px=4.0):
         """
         :param zone_manager: экземпляр ZoneManager
         :param window_seconds: окно времени для фильтрации флуктуаций
         :param min_confirmations: сколько раз подряд должен наблюдаться статус, чтобы он был принят
+        :param incremental: пересчитывать только места, задетые изменившимися детекциями
+        :param tolerance_px: допуск сопоставления детекций соседних кадров (инкрементальный режим), пикселей
         """
         self.zone_manager = zone_manager
-        self.history = defaultdict(lambda: defaultdict(deque))  # cam_id → slot_id → deque[(timestamp, is_free)]
         self.window_seconds = window_seconds
         self.min_confirmations = min_confirmations
+        self.incremental = incremental
+        self.tolerance_px = tolerance_px
+        # Все места камеры наблюдаются на каждом её кадре, поэтому история хранится сериями:
+        # для места — текущее значение и номер кадра, с которого оно держится, а времена кадров — общие на камеру.
+        # Неизменившееся место продлевает серию без какой-либо работы над ним.
+        self.frame_index = defaultdict(int)  # cam_id → номер последнего кадра
+        self.frame_times = defaultdict(lambda: deque(maxlen=self.min_confirmations))  # cam_id → времена последних кадров
+        self.runs = defaultdict(dict)  # cam_id → slot_id → (is_free, номер кадра начала серии)
+        self.pending = defaultdict(set)  # cam_id → места, чья серия отличается от стабильного статуса
+        self.current_status = defaultdict(dict)  # cam_id → slot_id → выдаваемый статус
         self.latest_stable_status = defaultdict(dict)  # cam_id → slot_id → is_free
 
-    def analyze(self, cam_id, detections):
-        current_time = time.time()
-        raw_status = self.zone_manager.analyze_occupancy(cam_id, detections)
+    def analyze(self, cam_id, detections, frame=None, now=None):
+        current_time = now or time.time()
+        if cam_id not in self.frame_index:
+            self.zone_manager.reset_delta(cam_id)  # состояние камеры пусто — нужен статус всех мест
+        if self.incremental:
+            raw_status, full = self.zone_manager.analyze_occupancy_delta(cam_id, detections, frame=frame,
+                                                                         tolerance=self.tolerance_px)
+        else:
+            raw_status, full = self.zone_manager.analyze_occupancy(cam_id, detections, frame=frame), True
 
-        stable_status = {}
-        for slot_id, is_free in raw_status.items():
-            hist = self.history[cam_id][slot_id]
-            hist.append((current_time, is_free))
+        index = self.frame_index[cam_id] = self.frame_index[cam_id] + 1
+        times = self.frame_times[cam_id]
+        times.append(current_time)
+        runs = self.runs[cam_id]
+        pending = self.pending[cam_id]
+        stable = self.latest_stable_status[cam_id]
+        output = self.current_status[cam_id]
 
-            # Очистка старых записей за пределами окна
-            while hist and (current_time - hist[0][0] > self.window_seconds):
-                hist.popleft()
+        if full:
+            # Места, исчезнувшие из разметки, убираются из ответа
+            for slot_id in output.keys() - raw_status.keys():
+                output.pop(slot_id)
+                runs.pop(slot_id, None)
+                pending.discard(slot_id)
 
-            # Проверка, стабилен ли статус
-            states = [status for _, status in hist]
-            if len(states) >= self.min_confirmations and all(s == is_free for s in states[-self.min_confirmations:]):
-                self.latest_stable_status[cam_id][slot_id] = is_free
+        for slot_id, is_free in raw_status.items():
+            run = runs.get(slot_id)
+            if run is None or run[0] != is_free:
+                runs[slot_id] = (is_free, index)
+                if stable.get(slot_id) == is_free:
+                    pending.discard(slot_id)
+                else:
+                    pending.add(slot_id)
+            if slot_id not in output:
+                output[slot_id] = stable.get(slot_id, True)
 
-            # Возвращаем последнее стабильное значение
-            stable_status[slot_id] = self.latest_stable_status[cam_id].get(slot_id, True)
+        # Проверка, стабилен ли статус: серия длиной не меньше min_confirmations кадров,
+        # и все эти кадры — в пределах окна (окно одно на камеру, проверяется один раз)
+        if pending and len(times) >= self.min_confirmations and current_time - times[0] <= self.window_seconds:
+            confirmed = [s for s in pending if index - runs[s][1] + 1 >= self.min_confirmations]
+            for slot_id in confirmed:
+                stable[slot_id] = output[slot_id] = runs[slot_id][0]
+                pending.discard(slot_id)
 
-        return stable_status
+        # Возвращаем последние стабильные значения
+        return dict(output)
 
     def get_latest_status(self, cam_id):
         return self.latest_stable_status.get(cam_id, {})
 
+    def get_state(self):
+        """Стабильные статусы для снимка состояния: {cam_id: {slot_id: is_free}}."""
+        return {cam_id: dict(slots) for cam_id, slots in self.latest_stable_status.items()}
+
+    def load_state(self, state):
+        """
+        Восстанавливает стабильные статусы из снимка. История не восстанавливается:
+        для смены статуса по-прежнему нужно min_confirmations новых наблюдений.
+        """
+        for cam_id, slots in state.items():
+            self.latest_stable_status[cam_id].update(slots)
+            output = self.current_status[cam_id]
+            output.update((slot_id, is_free) for slot_id, is_free in slots.items() if slot_id in output)
+            stable = self.latest_stable_status[cam_id]
+            self.pending[cam_id] = {slot_id for slot_id, (is_free, _) in self.runs[cam_id].items()
+                                    if stable.get(slot_id) != is_free}
+
+    def drop_slots(self, cam_id, slot_ids):
+        """Сбрасывает историю и стабильный статус мест (удалённых или изменённых в разметке)."""
+        for slot_id in slot_ids:
+            self.runs[cam_id].pop(slot_id, None)
+            self.pending[cam_id].discard(slot_id)
+            self.current_status[cam_id].pop(slot_id, None)
+            self.latest_stable_status[cam_id].pop(slot_id, None)
+        # Сброшенные места должны снова прийти в наблюдениях, даже если их детекции не менялись
+        self.zone_manager.reset_delta(cam_id)
+
+    def drop_camera(self, cam_id):
+        """Забывает всё состояние камеры (камера отключена или давно не присылала кадров)."""
+        for state in (self.frame_index, self.frame_times, self.runs, self.pending,
+                      self.current_status, self.latest_stable_status):
+            state.pop(cam_id, None)
+        self.zone_manager.reset_delta(cam_id)
+
     def clear_history(self):
-        self.history.clear()
-        self.latest_stable_status.clear()
+        for state in (self.frame_index, self.frame_times, self.runs, self.pending,
+                      self.current_status, self.latest_stable_status):
+            state.clear()
+        self.zone_manager.deltas.clear()
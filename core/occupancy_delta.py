@@ -0,0 +1,82 @@
+import numpy as np
+
+"""
+Инкрементальная оценка занятости мест по разнице детекций между кадрами.
+
+Между соседними кадрами почти все детекции — те же припаркованные машины почти в тех же координатах.
+Новый набор боксов сопоставляется с опорным (из прошлых кадров) с допуском tolerance пикселей:
+совпавшие боксы считаются теми же, и их вклад в занятость не пересчитывается; IoU со всеми
+местами считается только для новых боксов, а у исчезнувших вклад просто вычитается.
+Для опорных боксов хранится матрица покрытия (бокс × место, IoU >= порога): место занято,
+если его покрывает хотя бы один бокс.
+"""
+
+
+class IncrementalOccupancy:
+    def __init__(self, geometry, iou_threshold=0.5, tolerance=4.0):
+        """
+        :param geometry: ZoneGeometry камеры (при смене разметки создаётся новый экземпляр)
+        :param iou_threshold: порог IoU занятости — тот же, что в ZoneManager
+        :param tolerance: допуск сопоставления боксов, пикселей (по каждой координате, в координатах зон)
+        """
+        self.geometry = geometry
+        self.iou_threshold = iou_threshold
+        self.tolerance = tolerance
+        n = len(geometry.slot_ids)
+        self.refs = np.zeros((0, 4), dtype=np.float32)  # опорные боксы — координаты, по которым посчитан их вклад
+        self.covers = np.zeros((0, n), dtype=bool)  # опорный бокс × место: бокс занимает место
+        self.occupied = np.zeros(n, dtype=bool)
+
+    def _match(self, boxes):
+        """
+        Сопоставление новых боксов опорным: каждому — ближайший опорный в пределах допуска.
+        Если на один опорный претендуют несколько новых, его получает ближайший, остальные считаются новыми.
+        :return: numpy.ndarray (M,) — индекс опорного бокса для каждого нового или -1
+        """
+        matched = np.full(len(boxes), -1, dtype=np.int64)
+        if not len(boxes) or not len(self.refs):
+            return matched
+        dist = np.abs(boxes[:, None, 0] - self.refs[None, :, 0])
+        for k in range(1, 4):
+            np.maximum(dist, np.abs(boxes[:, None, k] - self.refs[None, :, k]), out=dist)
+        nearest = dist.argmin(axis=1)
+        nearest_dist = dist[np.arange(len(boxes)), nearest]
+        winners = np.flatnonzero(nearest_dist <= self.tolerance)
+        if len(winners) and np.bincount(nearest[winners]).max() > 1:
+            # Стабильная сортировка по расстоянию: при повторе опорного первым идёт ближайший претендент
+            winners = winners[np.argsort(nearest_dist[winners], kind="stable")]
+            _, first = np.unique(nearest[winners], return_index=True)
+            winners = winners[first]
+        matched[winners] = nearest[winners]
+        return matched
+
+    def update(self, detections, full=False):
+        """
+        :param detections: список [(x1, y1, x2, y2, cls_id, conf)] в координатах зон
+        :param full: вернуть статус всех мест, а не только изменившихся
+        :return: словарь {slot_id: True (свободно) / False (занято)} — только места, чья занятость изменилась
+        """
+        boxes = np.array([d[:4] for d in detections], dtype=np.float32).reshape(-1, 4)
+        matched = self._match(boxes)
+        if not full and len(boxes) == len(self.refs) and (matched >= 0).all():
+            return {}  # те же боксы в пределах допуска — ни одно место не задето
+
+        # Совпавшие боксы сохраняют опорные координаты и покрытие: медленный дрейф не накапливается мимо допуска
+        kept = matched >= 0
+        refs = boxes.copy()
+        refs[kept] = self.refs[matched[kept]]
+        covers = np.zeros((len(boxes), len(self.occupied)), dtype=bool)
+        covers[kept] = self.covers[matched[kept]]
+        added = np.flatnonzero(~kept)
+        if len(added):
+            covers[added] = (self.geometry.iou_matrix([detections[i] for i in added]) >= self.iou_threshold).T
+        self.refs, self.covers = refs, covers
+
+        occupied = covers.any(axis=0)
+        slot_ids = self.geometry.slot_ids
+        if full:
+            self.occupied = occupied
+            return {slot_id: not bool(is_occupied) for slot_id, is_occupied in zip(slot_ids, occupied)}
+        flipped = np.flatnonzero(occupied != self.occupied)
+        self.occupied = occupied
+        return {slot_ids[i]: not occupied[i] for i in flipped.tolist()}
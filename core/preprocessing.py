@@ -0,0 +1,153 @@
+import logging
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger("Preprocessing")
+
+# Веса BGR для оценки яркости (ITU-R BT.601)
+LUMA_WEIGHTS = np.array([0.114, 0.587, 0.299], dtype=np.float32)
+CLAHE_MODES = ("on", "off", "auto")
+
+
+def normalize_clahe_mode(value):
+    """
+    YAML 1.1 читает незакавыченные on/off как True/False — приводим обратно к строкам режима.
+    :return: "on" / "off" / "auto"
+    """
+    if isinstance(value, bool):
+        return "on" if value else "off"
+    mode = str(value).strip().lower()
+    if mode not in CLAHE_MODES:
+        raise ValueError(f"Unknown CLAHE mode {value!r}, expected one of {', '.join(CLAHE_MODES)}")
+    return mode
+
+
+class FramePreprocessor:
+    def __init__(self, clahe="on", clip_limit=3.0, tile_grid=8, luminance_threshold=70.0,
+                 luminance_hysteresis=10.0, luminance_interval=30, resolution="full", inference_width=640):
+        """
+        Предобработка кадров одной камеры с кэшированным CLAHE и переиспользуемыми буферами.
+
+        :param clahe: on — всегда / off — никогда / auto — только при низкой средней яркости (True/False — как on/off)
+        :param clip_limit: clipLimit для CLAHE
+        :param tile_grid: размер сетки тайлов CLAHE
+        :param luminance_threshold: средняя яркость (0–255), ниже которой CLAHE включается в режиме auto
+        :param luminance_hysteresis: запас яркости для выключения, чтобы режим не «дребезжал»
+        :param luminance_interval: как часто (в кадрах) пересчитывать яркость в режиме auto
+        :param resolution: full — обработка в исходном разрешении / inference — кадр уменьшается до inference_width
+        :param inference_width: ширина кадра в режиме inference
+        """
+        self.mode = normalize_clahe_mode(clahe)
+        self.clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(tile_grid, tile_grid))
+        self.luminance_threshold = luminance_threshold
+        self.luminance_hysteresis = luminance_hysteresis
+        self.luminance_interval = max(1, int(luminance_interval))
+        self.resolution = resolution
+        self.inference_width = inference_width
+
+        self.scale = 1.0  # ширина выходного кадра / ширина исходного
+        self.clahe_active = self.mode == "on"
+        self.frame_count = 0
+
+        # Буферы переиспользуются между кадрами и пересоздаются только при смене размера
+        self._resized = None
+        self._lab = None
+        self._l = None
+        self._out = None
+
+    @classmethod
+    def from_config(cls, cfg, cam_id=None):
+        """
+        :param cfg: секция preprocessing из config.yaml (dict / DictConfig)
+        :param cam_id: идентификатор камеры — учитываются переопределения из cfg.cameras
+        """
+        cfg = dict(cfg or {})
+        overrides = dict((cfg.pop("cameras", None) or {}).get(cam_id, None) or {})
+        params = {**cfg, **overrides}
+        return cls(**params)
+
+    @staticmethod
+    def _ensure(buf, shape, dtype=np.uint8):
+        if buf is None or buf.shape != shape:
+            return np.empty(shape, dtype=dtype)
+        return buf
+
+    def mean_luminance(self, frame):
+        """Оценка средней яркости по прореженному кадру (без полноразмерных аллокаций)."""
+        sample = frame[::16, ::16]
+        return float(sample.reshape(-1, 3).mean(axis=0) @ LUMA_WEIGHTS)
+
+    def _update_auto(self, frame):
+        if self.frame_count % self.luminance_interval != 0:
+            return
+        luminance = self.mean_luminance(frame)
+        was_active = self.clahe_active
+        if luminance < self.luminance_threshold:
+            self.clahe_active = True
+        elif luminance > self.luminance_threshold + self.luminance_hysteresis:
+            self.clahe_active = False
+        if was_active != self.clahe_active:
+            logger.info(f"[Preprocessing] CLAHE {'enabled' if self.clahe_active else 'disabled'} "
+                        f"(mean luminance {luminance:.1f})")
+
+    def output_shape(self, shape):
+        """Форма выходного кадра для входного кадра формы shape (для выделения буфера заранее)."""
+        h, w = shape[:2]
+        if self.resolution != "inference" or w <= self.inference_width:
+            return tuple(shape)
+        return (max(1, int(round(h * self.inference_width / w))), self.inference_width) + tuple(shape[2:])
+
+    def _resize(self, frame, dst=None):
+        h, w = frame.shape[:2]
+        if self.resolution != "inference" or w <= self.inference_width:
+            self.scale = 1.0
+            return frame
+
+        self.scale = self.inference_width / w
+        out_shape = self.output_shape(frame.shape)
+        if dst is None:
+            self._resized = self._ensure(self._resized, out_shape)
+            dst = self._resized
+        cv2.resize(frame, (out_shape[1], out_shape[0]), dst=dst, interpolation=cv2.INTER_AREA)
+        return dst
+
+    def apply_clahe(self, frame, dst=None):
+        """
+        CLAHE по каналу L в пространстве LAB с переиспользованием буферов.
+        :param dst: куда записать результат; по умолчанию — внутренний буфер препроцессора
+        """
+        self._lab = self._ensure(self._lab, frame.shape)
+        self._l = self._ensure(self._l, frame.shape[:2])
+        if dst is None:
+            self._out = self._ensure(self._out, frame.shape)
+            dst = self._out
+
+        cv2.cvtColor(frame, cv2.COLOR_BGR2LAB, dst=self._lab)
+        cv2.extractChannel(self._lab, 0, dst=self._l)
+        self.clahe.apply(self._l, dst=self._l)
+        cv2.insertChannel(self._l, self._lab, 0)
+        cv2.cvtColor(self._lab, cv2.COLOR_LAB2BGR, dst=dst)
+        return dst
+
+    def process(self, frame, dst=None):
+        """
+        Полная предобработка кадра: масштабирование (если включено) и CLAHE (если нужно).
+
+        Без dst возвращаемый массив может быть внутренним буфером препроцессора — он перезаписывается
+        следующим вызовом process, поэтому долгоживущим потребителям нужно делать копию.
+        :param dst: буфер формы output_shape(frame.shape) для результата; может совпадать с frame
+                    (обработка на месте, если масштабирование не нужно)
+        :return: numpy.ndarray — обработанный кадр (атрибут scale хранит коэффициент масштаба)
+        """
+        if self.mode == "auto":
+            self._update_auto(frame)
+        self.frame_count += 1
+
+        if not self.clahe_active:
+            out = self._resize(frame, dst=dst)
+            if dst is not None and out is not dst:
+                np.copyto(dst, out)
+                return dst
+            return out
+        return self.apply_clahe(self._resize(frame), dst=dst)
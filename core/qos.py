@@ -0,0 +1,197 @@
+import time
+import logging
+
+logger = logging.getLogger("QoS")
+
+# Уровни деградации — применяются строго по порядку
+LEVEL_NORMAL = 0
+LEVEL_SKIP_FRAMES = 1     # низкоприоритетные камеры обрабатывают только каждый skip_stride-й кадр
+LEVEL_LOW_RESOLUTION = 2  # инференс на уменьшенном imgsz
+LEVEL_NO_ANNOTATION = 3   # отключены отрисовка, запись видео и вывод на экран
+
+LEVEL_NAMES = {
+    LEVEL_NORMAL: "normal",
+    LEVEL_SKIP_FRAMES: "skip low-priority frames",
+    LEVEL_LOW_RESOLUTION: "reduced inference resolution",
+    LEVEL_NO_ANNOTATION: "annotation and recording off",
+}
+
+
+class CameraQos:
+    def __init__(self, priority, max_staleness, now):
+        """
+        :param priority: int — чем больше, тем важнее камера
+        :param max_staleness: float — допустимое время (сек) между решениями о занятости
+        """
+        self.priority = priority
+        self.max_staleness = max_staleness
+        self.last_decision = now
+        self.connected = True  # False — поток не отдаёт кадры (обрыв, переподключение)
+        self.frame_counter = 0
+        self.skipped = 0
+
+    def staleness(self, now):
+        return now - self.last_decision
+
+    def slack(self, now):
+        """Запас до дедлайна: > 0 — успеваем, < 0 — решение просрочено."""
+        return self.max_staleness - self.staleness(now)
+
+
+class QosController:
+    def __init__(self, cameras=None, default_priority=1, default_max_staleness=5.0, protected_priority=None,
+                 skip_stride=3, reduced_imgsz=320, escalate_after=3.0, recover_after=15.0, headroom=0.5):
+        """
+        Контроль свежести решений по камерам и поэтапный сброс нагрузки при перегрузке.
+
+        :param cameras: dict {cam_id: {"priority": int, "max_staleness": float}}
+        :param default_priority: приоритет камер, не указанных в cameras
+        :param default_max_staleness: допустимая «несвежесть» по умолчанию, сек
+        :param protected_priority: камеры с приоритетом >= этого значения никогда не пропускают кадры
+                                   (по умолчанию — максимальный приоритет из cameras)
+        :param skip_stride: на уровне LEVEL_SKIP_FRAMES обрабатывается каждый skip_stride-й кадр
+        :param reduced_imgsz: размер входа детектора на уровне LEVEL_LOW_RESOLUTION
+        :param escalate_after: сколько секунд перегрузка должна длиться до повышения уровня
+        :param recover_after: сколько секунд без перегрузки нужно для понижения уровня
+        :param headroom: доля max_staleness, которая должна оставаться в запасе для понижения уровня
+        """
+        self.camera_cfg = cameras or {}
+        self.default_priority = default_priority
+        self.default_max_staleness = default_max_staleness
+        priorities = [c.get("priority", default_priority) for c in self.camera_cfg.values()]
+        self.protected_priority = protected_priority if protected_priority is not None else max(
+            priorities, default=default_priority)
+        self.skip_stride = max(1, int(skip_stride))
+        self.reduced_imgsz = reduced_imgsz
+        self.escalate_after = escalate_after
+        self.recover_after = recover_after
+        self.headroom = headroom
+
+        self.cameras = {}  # cam_id → CameraQos
+        self.level = LEVEL_NORMAL
+        self.level_changed_at = time.time()
+        self.overloaded_since = None
+        self.healthy_since = None
+
+    @classmethod
+    def from_config(cls, cfg):
+        """
+        :param cfg: секция qos из config.yaml (dict / DictConfig)
+        """
+        params = dict(cfg or {})
+        params.pop("enabled", None)
+        params["cameras"] = {cam_id: dict(cam_cfg) for cam_id, cam_cfg in (params.get("cameras") or {}).items()}
+        return cls(**params)
+
+    def register(self, cam_id):
+        cam_cfg = self.camera_cfg.get(cam_id, {})
+        self.cameras[cam_id] = CameraQos(priority=cam_cfg.get("priority", self.default_priority),
+                                         max_staleness=cam_cfg.get("max_staleness", self.default_max_staleness),
+                                         now=time.time())
+        return self.cameras[cam_id]
+
+    def unregister(self, cam_id):
+        """Остановленная камера не должна считаться отстающей и поднимать уровень деградации."""
+        self.cameras.pop(cam_id, None)
+
+    def is_sheddable(self, cam_id):
+        return self.cameras[cam_id].priority < self.protected_priority
+
+    def should_process(self, cam_id):
+        """
+        Нужно ли обрабатывать текущий кадр камеры (кадр всё равно читается, чтобы не копить задержку).
+        """
+        cam = self.cameras[cam_id]
+        cam.frame_counter += 1
+        if self.level < LEVEL_SKIP_FRAMES or not self.is_sheddable(cam_id):
+            return True
+        if cam.frame_counter % self.skip_stride == 0:
+            return True
+        cam.skipped += 1
+        return False
+
+    def inference_size(self, cam_id):
+        """:return: imgsz для детектора или None (размер модели по умолчанию)"""
+        return self.reduced_imgsz if self.level >= LEVEL_LOW_RESOLUTION else None
+
+    def annotation_enabled(self, cam_id):
+        return self.level < LEVEL_NO_ANNOTATION
+
+    def mark_disconnected(self, cam_id):
+        """
+        Поток камеры не отдал кадр. Пока кадров нет, камера не участвует в оценке перегрузки:
+        сброс нагрузки с других камер её не оживит.
+        """
+        self.cameras[cam_id].connected = False
+
+    def mark_connected(self, cam_id, now=None):
+        """Кадр получен. После обрыва отсчёт свежести начинается заново — с момента восстановления потока."""
+        cam = self.cameras[cam_id]
+        if not cam.connected:
+            cam.connected = True
+            cam.last_decision = now or time.time()
+
+    def record_decision(self, cam_id, now=None):
+        """Отмечает, что по камере принято свежее решение о занятости."""
+        self.cameras[cam_id].last_decision = now or time.time()
+
+    def _counted_cameras(self):
+        # Камеры без кадров опаздывают не из-за нагрузки, а пропускающие кадры — и так опаздывают:
+        # по ним перегрузку не оцениваем
+        cameras = [(cam_id, c) for cam_id, c in self.cameras.items() if c.connected]
+        if self.level >= LEVEL_SKIP_FRAMES:
+            return [c for cam_id, c in cameras if not self.is_sheddable(cam_id)]
+        return [c for _, c in cameras]
+
+    def _set_level(self, level, now, reason):
+        logger.warning(f"[QoS] Degradation level {self.level} → {level} ({LEVEL_NAMES[level]}): {reason}")
+        self.level = level
+        self.level_changed_at = now
+        self.overloaded_since = None
+        self.healthy_since = None
+
+    def update(self, now=None):
+        """
+        Пересчитывает уровень деградации по запасу до дедлайнов. Вызывается периодически.
+        """
+        now = now or time.time()
+        # Без оцениваемых камер (все без кадров) перегрузки нет — уровень постепенно понижается
+        cameras = self._counted_cameras()
+        late = [c for c in cameras if c.slack(now) < 0]
+        comfortable = all(c.slack(now) >= c.max_staleness * self.headroom for c in cameras)
+
+        if late:
+            self.healthy_since = None
+            self.overloaded_since = self.overloaded_since or now
+            if now - self.overloaded_since >= self.escalate_after and self.level < LEVEL_NO_ANNOTATION:
+                level = self.level + 1
+                # Без низкоприоритетных камер пропуск кадров ничего не даёт
+                if level == LEVEL_SKIP_FRAMES and not any(self.is_sheddable(c) for c in self.cameras):
+                    level += 1
+                self._set_level(level, now, f"{len(late)} camera(s) past deadline")
+        elif comfortable:
+            self.overloaded_since = None
+            self.healthy_since = self.healthy_since or now
+            if now - self.healthy_since >= self.recover_after and self.level > LEVEL_NORMAL:
+                self._set_level(self.level - 1, now, "all deadlines met with headroom")
+        else:
+            self.overloaded_since = None
+            self.healthy_since = None
+
+        return self.level
+
+    def get_stats(self, now=None):
+        """
+        :return: dict {cam_id: {"priority", "staleness", "slack", "skipped", "connected"}}
+        """
+        now = now or time.time()
+        return {
+            cam_id: {
+                "priority": cam.priority,
+                "staleness": cam.staleness(now),
+                "slack": cam.slack(now),
+                "skipped": cam.skipped,
+                "connected": cam.connected,
+            }
+            for cam_id, cam in self.cameras.items()
+        }
@@ -0,0 +1,127 @@
+import logging
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from core.utils import scale_box
+
+logger = logging.getLogger("RoiClassifier")
+
+
+class RoiOccupancyClassifier:
+    def __init__(self, model_path=None, input_size=64):
+        """
+        Лёгкий классификатор занятости по ROI парковочных мест: HOG + логистическая регрессия.
+
+        :param model_path: путь к .npz с весами (создаётся tools/train_roi_classifier.py)
+        :param input_size: сторона квадрата, к которому приводится каждый ROI
+        """
+        self.input_size = int(input_size)
+        self.hog = self._create_hog(self.input_size)
+        self.weights = None
+        self.bias = 0.0
+
+        if model_path is not None:
+            self.load(model_path)
+
+    @staticmethod
+    def _create_hog(size):
+        cell = max(size // 8, 4)
+        block = cell * 2
+        return cv2.HOGDescriptor((size, size), (block, block), (cell, cell), (cell, cell), 9)
+
+    def _prepare(self, roi):
+        if roi.ndim == 3:
+            roi = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(roi, (self.input_size, self.input_size), interpolation=cv2.INTER_AREA)
+
+    def extract_features(self, rois):
+        """
+        :param rois: список изображений ROI (BGR или grayscale, любого размера)
+        :return: numpy.ndarray (N, F) — HOG-признаки
+        """
+        if not rois:
+            return np.empty((0, self.hog.getDescriptorSize()), dtype=np.float32)
+        return np.stack([self.hog.compute(self._prepare(roi)).ravel() for roi in rois])
+
+    def crop_zones(self, frame, zones, scale=1.0):
+        """
+        Вырезает ROI всех зон камеры.
+        :param scale: масштаб кадра относительно координат зон
+        :return: (slot_ids, rois) — зоны с пустым ROI пропускаются
+        """
+        h, w = frame.shape[:2]
+        slot_ids, rois = [], []
+        for slot_id, slot_data in zones.items():
+            x1, y1, x2, y2 = scale_box(slot_data["coords"], scale)
+            x1, x2 = max(0, min(x1, x2)), min(w, max(x1, x2))
+            y1, y2 = max(0, min(y1, y2)), min(h, max(y1, y2))
+            if x2 <= x1 or y2 <= y1:
+                continue
+            slot_ids.append(slot_id)
+            rois.append(frame[y1:y2, x1:x2])
+        return slot_ids, rois
+
+    def predict_proba(self, features):
+        """
+        :return: numpy.ndarray (N,) — вероятность того, что место свободно
+        """
+        if self.weights is None:
+            raise RuntimeError("[RoiClassifier] Model is not trained or loaded")
+        logits = features @ self.weights + self.bias
+        return 1.0 / (1.0 + np.exp(-logits))
+
+    def predict(self, frame, zones, scale=1.0):
+        """
+        Классифицирует все зоны камеры одним батчем.
+        :param frame: numpy.ndarray — кадр
+        :param zones: словарь зон {slot_id: {"coords": [x1, y1, x2, y2], ...}}
+        :param scale: масштаб кадра относительно координат зон
+        :return: словарь {slot_id: True (свободно) / False (занято)}
+        """
+        slot_ids, rois = self.crop_zones(frame, zones, scale=scale)
+        status = {slot_id: True for slot_id in zones}
+        if not rois:
+            return status
+
+        probs = self.predict_proba(self.extract_features(rois))
+        for slot_id, p_free in zip(slot_ids, probs):
+            status[slot_id] = bool(p_free >= 0.5)
+        return status
+
+    def fit(self, features, labels, epochs=300, lr=0.5, l2=1e-3):
+        """
+        Обучение логистической регрессии градиентным спуском.
+        :param features: numpy.ndarray (N, F)
+        :param labels: numpy.ndarray (N,) — 1: свободно, 0: занято
+        """
+        features = np.asarray(features, dtype=np.float32)
+        labels = np.asarray(labels, dtype=np.float32)
+        n, f = features.shape
+        self.weights = np.zeros(f, dtype=np.float32)
+        self.bias = 0.0
+
+        for _ in range(epochs):
+            p = self.predict_proba(features)
+            err = p - labels
+            self.weights -= lr * (features.T @ err / n + l2 * self.weights)
+            self.bias -= lr * float(err.mean())
+
+        accuracy = float(((self.predict_proba(features) >= 0.5) == (labels >= 0.5)).mean())
+        logger.info(f"[RoiClassifier] Trained on {n} samples, train accuracy: {accuracy:.3f}")
+        return accuracy
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, weights=self.weights, bias=self.bias, input_size=self.input_size)
+        logger.info(f"[RoiClassifier] Saved model to {path}")
+
+    def load(self, path):
+        data = np.load(path)
+        self.input_size = int(data["input_size"])
+        self.hog = self._create_hog(self.input_size)
+        self.weights = data["weights"].astype(np.float32)
+        self.bias = float(data["bias"])
+        logger.info(f"[RoiClassifier] Loaded model from {path}")
@@ -0,0 +1,130 @@
+import os
+import time
+import struct
+import logging
+from pathlib import Path
+
+logger = logging.getLogger("StateSnapshot")
+
+MAGIC = b"PRKS"
+VERSION = 2
+HEADER = struct.Struct("<4sBdII")  # magic, version, timestamp, число записей analyzer, число записей aggregator
+LENGTHS = {1: struct.Struct("<B"), 2: struct.Struct("<H")}  # префикс длины идентификатора по версии формата
+MAX_ID_BYTES = 0xFFFF
+
+
+def _pack_entries(entries):
+    """
+    :param entries: итерируемое (cam_id, slot_id, is_free)
+    :return: (bytes, count) — последовательность [len][cam_id][len][slot_id][flag] и число записей;
+             записи с идентификаторами длиннее MAX_ID_BYTES пропускаются
+    """
+    chunks = []
+    for cam_id, slot_id, is_free in entries:
+        cam = str(cam_id).encode("utf-8")
+        slot = str(slot_id).encode("utf-8")
+        if len(cam) > MAX_ID_BYTES or len(slot) > MAX_ID_BYTES:
+            logger.warning(f"[StateSnapshot] Identifier too long for snapshot, skipping {str(cam_id)[:40]}… / {str(slot_id)[:40]}…")
+            continue
+        chunks.append(struct.pack(f"<H{len(cam)}sH{len(slot)}s?", len(cam), cam, len(slot), slot, bool(is_free)))
+    return b"".join(chunks), len(chunks)
+
+
+def _unpack_entries(data, offset, count, version=VERSION):
+    length = LENGTHS[version]
+    entries = []
+    for _ in range(count):
+        (cam_len,) = length.unpack_from(data, offset)
+        offset += length.size
+        cam_id = data[offset:offset + cam_len].decode("utf-8")
+        offset += cam_len
+        (slot_len,) = length.unpack_from(data, offset)
+        offset += length.size
+        slot_id = data[offset:offset + slot_len].decode("utf-8")
+        offset += slot_len
+        entries.append((cam_id, slot_id, bool(data[offset])))
+        offset += 1
+    return entries, offset
+
+
+class StateSnapshotter:
+    def __init__(self, path="state/occupancy.snap", max_age_seconds=300.0):
+        """
+        Компактный бинарный снимок стабильных статусов для быстрого «тёплого» рестарта.
+
+        :param path: путь к файлу снимка
+        :param max_age_seconds: снимок старше этого значения при старте игнорируется
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_age_seconds = max_age_seconds
+
+    def save(self, analyzer, aggregator, now=None):
+        """
+        Атомарно записывает снимок: во временный файл рядом и os.replace поверх старого,
+        так что читатель всегда видит либо старый, либо новый снимок целиком.
+        """
+        stable = [(cam_id, slot_id, is_free)
+                  for cam_id, slots in analyzer.get_state().items()
+                  for slot_id, is_free in slots.items()]
+        reports = [(cam_id, slot_id, is_free)
+                   for slot_id, cams in aggregator.get_state().items()
+                   for cam_id, is_free in cams.items()]
+
+        stable_data, n_stable = _pack_entries(stable)
+        reports_data, n_reports = _pack_entries(reports)
+        header = HEADER.pack(MAGIC, VERSION, now or time.time(), n_stable, n_reports)
+        payload = header + stable_data + reports_data
+
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, self.path)
+        return len(payload)
+
+    def load(self, now=None):
+        """
+        :return: (stable, reports) — {cam_id: {slot_id: bool}}, {slot_id: {cam_id: bool}}
+                 или None, если снимка нет, он повреждён или устарел
+        """
+        if not self.path.exists():
+            return None
+
+        data = self.path.read_bytes()
+        try:
+            magic, version, timestamp, n_stable, n_reports = HEADER.unpack_from(data, 0)
+            if magic != MAGIC or version not in LENGTHS:
+                logger.warning(f"[StateSnapshot] Unknown snapshot format in {self.path}, ignoring")
+                return None
+            stable_entries, offset = _unpack_entries(data, HEADER.size, n_stable, version)
+            report_entries, _ = _unpack_entries(data, offset, n_reports, version)
+        except (struct.error, IndexError, UnicodeDecodeError):
+            logger.warning(f"[StateSnapshot] Corrupted snapshot {self.path}, ignoring")
+            return None
+
+        age = (now or time.time()) - timestamp
+        if age > self.max_age_seconds:
+            logger.info(f"[StateSnapshot] Snapshot is {age:.0f}s old (max {self.max_age_seconds:.0f}s), ignoring")
+            return None
+
+        stable, reports = {}, {}
+        for cam_id, slot_id, is_free in stable_entries:
+            stable.setdefault(cam_id, {})[slot_id] = is_free
+        for cam_id, slot_id, is_free in report_entries:
+            reports.setdefault(slot_id, {})[cam_id] = is_free
+        logger.info(f"[StateSnapshot] Loaded snapshot ({age:.0f}s old): "
+                    f"{len(stable_entries)} stable statuses, {len(report_entries)} camera reports")
+        return stable, reports
+
+    def restore(self, analyzer, aggregator, now=None):
+        """
+        Восстанавливает состояние analyzer и aggregator из снимка.
+        :return: bool — удалось ли восстановить
+        """
+        snapshot = self.load(now=now)
+        if snapshot is None:
+            return False
+        stable, reports = snapshot
+        analyzer.load_state(stable)
+        aggregator.load_state(reports)
+        return True
@@ -0,0 +1,236 @@
+import json
+import asyncio
+import logging
+import secrets
+from collections import deque
+
+logger = logging.getLogger("StatusApi")
+
+"""
+HTTP API статусов мест (без сторонних зависимостей, на asyncio).
+
+    GET /status  — полный снимок {"epoch": E, "version": N, "slots": {slot_id: true/false}}
+                   ETag = "E-N"; If-None-Match с текущим ETag → 304 без тела
+    GET /events  — Server-Sent Events: сначала event: snapshot, затем event: delta
+                   {"epoch": E, "version": N, "changes": {slot_id: true/false/null}} только по изменившимся местам.
+                   id события — "E-N"; при переподключении с Last-Event-ID из недавней истории того же
+                   процесса клиент получает пропущенные дельты вместо полного снимка.
+null — место больше не отслеживается ни одной камерой.
+E (epoch) — случайный идентификатор процесса: версии считаются заново после перезапуска,
+и ETag или Last-Event-ID прежнего процесса не должны совпасть с новыми (клиент получит полный снимок).
+"""
+
+SUBSCRIBER_QUEUE_SIZE = 1024  # клиент, отставший больше чем на столько событий, отключается
+
+
+def _json(data):
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+class StatusPublisher:
+    def __init__(self, aggregator, backlog=1024):
+        """
+        Инкрементальный итоговый статус мест: пересчитываются только места из изменившихся отчётов.
+
+        :param aggregator: экземпляр GlobalAggregator
+        :param backlog: сколько последних дельт хранить (для переподключения SSE и консоли)
+        """
+        self.aggregator = aggregator
+        self.status = {slot_id: is_free for slot_id, is_free in aggregator.get_aggregated_status().items()}
+        self.epoch = secrets.token_hex(4)
+        self.version = 0
+        self.history = deque(maxlen=backlog)  # (version, changes)
+        self.subscribers = set()  # asyncio.Queue
+        self._snapshot_cache = None  # (version, bytes) — тело /status сериализуется один раз на версию
+        aggregator.add_listener(self.on_update)
+
+    def on_update(self, cam_id, changed):
+        """Слушатель GlobalAggregator.add_listener."""
+        changes = {}
+        for slot_id in changed:
+            is_free = self.aggregator.aggregate_slot(slot_id)
+            if is_free == self.status.get(slot_id):
+                continue
+            if is_free is None:
+                self.status.pop(slot_id, None)
+            else:
+                self.status[slot_id] = is_free
+            changes[slot_id] = is_free
+        if changes:
+            self.publish(changes)
+
+    def publish(self, changes):
+        self.version += 1
+        self.history.append((self.version, changes))
+        event = (self.version, changes)
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Медленный клиент: отключаем, при переподключении он получит снимок
+                logger.warning("[StatusApi] Slow SSE client disconnected")
+                self.subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    @property
+    def tag(self):
+        """ETag и id SSE-события текущей версии: "epoch-version"."""
+        return f"{self.epoch}-{self.version}"
+
+    def parse_tag(self, tag):
+        """
+        :param tag: значение Last-Event-ID / If-None-Match
+        :return: версия, если tag выдан этим процессом, иначе None
+        """
+        epoch, _, version = str(tag).strip().strip('"').rpartition("-")
+        if epoch != self.epoch or not version.isdigit():
+            return None
+        return int(version)
+
+    def changes_since(self, version):
+        """
+        :return: dict {slot_id: bool | None} — суммарные изменения после version,
+                 или None, если нужные дельты уже вытеснены из истории
+        """
+        if version == self.version:
+            return {}
+        if not self.history or self.history[0][0] > version + 1 or version > self.version:
+            return None
+        merged = {}
+        for event_version, changes in self.history:
+            if event_version > version:
+                merged.update(changes)
+        return merged
+
+    def snapshot_body(self):
+        if self._snapshot_cache is None or self._snapshot_cache[0] != self.version:
+            body = _json({"epoch": self.epoch, "version": self.version, "slots": self.status}).encode("utf-8")
+            self._snapshot_cache = (self.version, body)
+        return self._snapshot_cache[1]
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def disconnect_all(self):
+        """Завершает все SSE-потоки (при остановке сервера)."""
+        for queue in list(self.subscribers):
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+        self.subscribers.clear()
+
+
+class StatusServer:
+    def __init__(self, publisher, host="127.0.0.1", port=8080, keepalive_interval=15.0):
+        """
+        :param publisher: экземпляр StatusPublisher
+        :param keepalive_interval: период SSE-комментариев, чтобы прокси не закрывали простаивающее соединение
+        """
+        self.publisher = publisher
+        self.host = host
+        self.port = port
+        self.keepalive_interval = keepalive_interval
+
+    @staticmethod
+    async def _read_request(reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        parts = request_line.decode("latin-1").split()
+        if len(parts) < 2:
+            raise ValueError(f"Malformed request line: {request_line!r}")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return parts[0], parts[1].split("?", 1)[0], headers
+
+    @staticmethod
+    def _response(status, headers=(), body=b""):
+        lines = [f"HTTP/1.1 {status}", f"Content-Length: {len(body)}", *headers]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+    def _status_response(self, headers):
+        etag = f'"{self.publisher.tag}"'
+        if headers.get("if-none-match") == etag:
+            return self._response("304 Not Modified", [f"ETag: {etag}"])
+        return self._response("200 OK", ["Content-Type: application/json; charset=utf-8", f"ETag: {etag}",
+                                         "Cache-Control: no-cache"], self.publisher.snapshot_body())
+
+    async def _stream_events(self, writer, headers):
+        writer.write(("HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                      "Cache-Control: no-cache\r\nConnection: keep-alive\r\n\r\n").encode("latin-1"))
+        publisher = self.publisher
+        queue = publisher.subscribe()
+        try:
+            missed = None
+            last_version = publisher.parse_tag(headers.get("last-event-id", ""))
+            if last_version is not None:
+                missed = publisher.changes_since(last_version)
+            # Id другого процесса (перезапуск), неизвестный или слишком старый — полный снимок
+            head = {"epoch": publisher.epoch, "version": publisher.version}
+            if missed is None:
+                writer.write(f"id: {publisher.tag}\nevent: snapshot\n"
+                             f"data: {_json({**head, 'slots': publisher.status})}\n\n".encode("utf-8"))
+            elif missed:
+                writer.write(f"id: {publisher.tag}\nevent: delta\n"
+                             f"data: {_json({**head, 'changes': missed})}\n\n".encode("utf-8"))
+            await writer.drain()
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=self.keepalive_interval)
+                except asyncio.TimeoutError:
+                    writer.write(b": keepalive\n\n")
+                    await writer.drain()
+                    continue
+                if event is None:
+                    return
+                version, changes = event
+                writer.write(f"id: {publisher.epoch}-{version}\nevent: delta\n"
+                             f"data: {_json({'epoch': publisher.epoch, 'version': version, 'changes': changes})}\n\n"
+                             .encode("utf-8"))
+                await writer.drain()
+        finally:
+            self.publisher.unsubscribe(queue)
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers = request
+                if method != "GET":
+                    writer.write(self._response("405 Method Not Allowed", ["Allow: GET"]))
+                elif path == "/status":
+                    writer.write(self._status_response(headers))
+                elif path == "/events":
+                    await self._stream_events(writer, headers)
+                    break
+                else:
+                    writer.write(self._response("404 Not Found"))
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, ValueError) as e:
+            logger.debug(f"[StatusApi] Client error: {e}")
+        finally:
+            writer.close()
+
+    async def run(self, stop_event):
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"[StatusApi] Listening on http://{self.host}:{self.port} (/status, /events)")
+        async with server:
+            await stop_event.wait()
+            self.publisher.disconnect_all()
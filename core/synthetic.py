@@ -0,0 +1,276 @@
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger("Synthetic")
+
+"""
+Синтетические камеры для нагрузочного тестирования без реальных видео.
+
+    synthetic://1280x720@10?cars=40&seed=3&movers=2&realtime=1
+
+    WxH       — разрешение кадра
+    @fps      — частота кадров (при realtime=1 чтение выдерживает этот темп)
+    cars      — число парковочных мест в сетке
+    seed      — зерно генератора: расположение занятых мест и их смена во времени
+    movers    — машины, проезжающие по полосе между рядами (не должны занимать места)
+    realtime  — 0: кадры выдаются без пауз, для поиска предела пропускной способности
+
+Сцена детерминирована: кадр с номером N всегда одинаков, время сцены — N / fps.
+Одна и та же сцена (URL) используется захватом, детектором-заглушкой и генератором зон.
+"""
+
+PREFIX = "synthetic://"
+SLOT_COLOR = (255, 255, 255)
+ASPHALT_COLOR = (70, 70, 70)
+CAR_CLASS_ID = 2  # car в COCO — проходит фильтр классов так же, как реальные детекции
+
+_SCENES = {}  # url → SyntheticScene
+_SCENES_LOCK = threading.Lock()
+
+
+def is_synthetic(source):
+    return isinstance(source, str) and source.startswith(PREFIX)
+
+
+def parse_synthetic_url(url):
+    """
+    :param url: synthetic://WxH@fps?cars=N&seed=S
+    :return: dict с параметрами сцены
+    """
+    parts = urlsplit(url)
+    if parts.scheme != "synthetic":
+        raise ValueError(f"Not a synthetic source: {url}")
+    try:
+        size, _, fps = parts.netloc.partition("@")
+        width, height = (int(v) for v in size.lower().split("x"))
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        return {
+            "width": width,
+            "height": height,
+            "fps": float(fps or 10),
+            "cars": int(query.get("cars", 20)),
+            "seed": int(query.get("seed", 0)),
+            "movers": int(query.get("movers", 2)),
+            "realtime": query.get("realtime", "1") not in ("0", "false", "no"),
+        }
+    except ValueError as e:
+        raise ValueError(f"Malformed synthetic source '{url}': {e}") from None
+
+
+def get_scene(url):
+    """Сцена из реестра процесса; создаётся при первом обращении."""
+    with _SCENES_LOCK:
+        scene = _SCENES.get(url)
+        if scene is None:
+            scene = SyntheticScene(**parse_synthetic_url(url))
+            _SCENES[url] = scene
+        return scene
+
+
+class SyntheticScene:
+    def __init__(self, width=1280, height=720, fps=10.0, cars=20, seed=0, movers=2, realtime=True):
+        """
+        Парковка-сетка: ряды мест, между парами рядов — полоса проезда.
+        Каждое место периодически освобождается и занимается со своим периодом и фазой.
+        """
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.realtime = realtime
+        rng = np.random.default_rng(seed)
+
+        cols = max(1, int(np.ceil(np.sqrt(cars * width / height))))
+        rows = max(1, int(np.ceil(cars / cols)))
+        cell_w, cell_h = width / cols, height / (rows + (rows + 1) // 2)  # на каждые два ряда — полоса
+        self.slots = []  # [x1, y1, x2, y2]
+        self.lanes = []  # y-центр полос проезда
+        y = 0.0
+        for row in range(rows):
+            if row % 2 == 0:
+                self.lanes.append(y + cell_h / 2)
+                y += cell_h
+            for col in range(cols):
+                if len(self.slots) == cars:
+                    break
+                x1 = col * cell_w
+                self.slots.append([int(x1 + cell_w * 0.1), int(y + cell_h * 0.1),
+                                   int(x1 + cell_w * 0.9), int(y + cell_h * 0.9)])
+            y += cell_h
+        self.slot_boxes = np.array(self.slots, dtype=np.int32).reshape(-1, 4)
+
+        # Смена занятости: период 1–10 минут времени сцены, случайная фаза и доля занятости
+        self.periods = rng.uniform(60.0, 600.0, len(self.slots))
+        self.phases = rng.uniform(0.0, 1.0, len(self.slots))
+        self.duty = rng.uniform(0.3, 0.9, len(self.slots))
+
+        self.mover_size = (int(cell_w * 0.8), int(cell_h * 0.6))
+        self.mover_speeds = rng.uniform(0.05, 0.2, movers) * width  # пикселей в секунду сцены
+        self.mover_offsets = rng.uniform(0.0, width, movers)
+        self.mover_lanes = rng.integers(0, max(1, len(self.lanes)), movers)
+
+        self.background = np.full((height, width, 3), ASPHALT_COLOR, dtype=np.uint8)
+        for x1, y1, x2, y2 in self.slots:
+            cv2.rectangle(self.background, (x1, y1), (x2, y2), SLOT_COLOR, 1)
+
+
+    def boxes_at(self, index):
+        """
+        :param index: номер кадра
+        :return: список (x1, y1, x2, y2) машин на кадре — занятые места и проезжающие машины
+        """
+        t = index / self.fps
+        occupied = ((t / self.periods + self.phases) % 1.0) < self.duty
+        boxes = [tuple(box) for box in self.slot_boxes[occupied].tolist()]
+
+        mw, mh = self.mover_size
+        for speed, offset, lane in zip(self.mover_speeds, self.mover_offsets, self.mover_lanes):
+            if not self.lanes:
+                break
+            x = int((offset + speed * t) % (self.width + mw)) - mw
+            y = int(self.lanes[lane] - mh / 2)
+            boxes.append((max(0, x), y, min(self.width, x + mw), y + mh))
+        return [b for b in boxes if b[2] > b[0] and b[3] > b[1]]
+
+    def render(self, index, image=None):
+        """
+        :param image: numpy.ndarray — буфер кадра (переиспользуется, если подходит по размеру)
+        :return: numpy.ndarray — кадр BGR
+        """
+        if image is None or image.shape != self.background.shape:
+            image = np.empty_like(self.background)
+        np.copyto(image, self.background)
+        for x1, y1, x2, y2 in self.boxes_at(index):
+            cv2.rectangle(image, (x1, y1), (x2 - 1, y2 - 1), (40, 40, 180), -1)
+        return image
+
+    def zones(self, cam_id, trust=0.9):
+        """Разметка мест сцены в формате config/zones/{cam_id}.json."""
+        return {
+            f"{cam_id}-{i + 1:04d}": {"name": f"slot_{i + 1}", "coords": list(box), "trust": trust}
+            for i, box in enumerate(self.slots)
+        }
+
+
+class SyntheticCapture:
+    def __init__(self, url):
+        """
+        Замена cv2.VideoCapture для synthetic:// источников (тот же минимальный интерфейс).
+
+        :param url: synthetic://WxH@fps?cars=N&seed=S
+        """
+        self.url = url
+        self.scene = get_scene(url)
+        self.index = -1
+        self.opened = True
+        self.next_due = None
+
+    def isOpened(self):
+        return self.opened
+
+    def grab(self):
+        if not self.opened:
+            return False
+        if self.scene.realtime:
+            now = time.perf_counter()
+            if self.next_due is None:
+                self.next_due = now
+            elif self.next_due > now:
+                time.sleep(self.next_due - now)
+            self.next_due = max(self.next_due, now - 1.0) + 1.0 / self.scene.fps
+        self.index += 1
+        return True
+
+    def retrieve(self, image=None):
+        if self.index < 0:
+            return False, None
+        return True, self.scene.render(self.index, image)
+
+    def read(self, image=None):
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.scene.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.scene.height)
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.scene.fps)
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.index + 1)
+        return 0.0  # CAP_PROP_FRAME_COUNT = 0 — бесконечный поток, как у камеры
+
+    def release(self):
+        self.opened = False
+
+
+class SyntheticDetector:
+    def __init__(self, latency=0.0):
+        """
+        Детектор-заглушка: возвращает истинные боксы машин кадра, который сейчас обрабатывает камера.
+        Сцена и номер кадра берутся из VideoStream.last_frame_info потока камеры (attach_stream):
+        цикл камеры вызывает detect до чтения следующего кадра, а у каждой камеры — свой поток,
+        поэтому ответ верен, даже если несколько камер читают одну сцену.
+
+        :param latency: искусственная задержка инференса, сек (имитация модели)
+        """
+        self.latency = latency
+        self.streams = {}  # cam_id → VideoStream
+
+    def attach_stream(self, cam_id, stream):
+        self.streams[cam_id] = stream
+
+    def drop_camera(self, cam_id):
+        self.streams.pop(cam_id, None)
+
+    def detect(self, frame, cam_id=None, imgsz=None):
+        if self.latency:
+            time.sleep(self.latency)
+        stream = self.streams.get(cam_id)
+        info = stream.last_frame_info if stream else None
+        if info is None or not is_synthetic(info[0]):
+            raise ValueError(f"No synthetic stream attached for {cam_id}")
+        url, index = info
+        scene = get_scene(url)
+        # Кадр мог быть уменьшен препроцессором — детекции в координатах кадра
+        scale = frame.shape[1] / scene.width
+        if abs(frame.shape[0] - scene.height * scale) > 1:
+            raise ValueError(f"Synthetic detector of {cam_id} needs whole frames, got {frame.shape[:2]}")
+        return [(int(x1 * scale), int(y1 * scale), int(x2 * scale), int(y2 * scale), CAR_CLASS_ID, 1.0)
+                for x1, y1, x2, y2 in scene.boxes_at(index)]
+
+
+def build_synthetic_cameras(count, url_template, zones_dir, prefix="syn"):
+    """
+    Генерирует синтетические камеры и их файлы зон.
+
+    :param count: число камер
+    :param url_template: шаблон URL, {index} подставляется номер камеры (например, как seed)
+    :param zones_dir: папка для сгенерированных {cam_id}.json
+    :return: dict {cam_id: url}
+    """
+    zones_dir = Path(zones_dir)
+    zones_dir.mkdir(parents=True, exist_ok=True)
+    sources = {}
+    for index in range(count):
+        cam_id = f"{prefix}{index:03d}"
+        url = url_template.format(index=index)
+        zones = get_scene(url).zones(cam_id)
+
+        path = zones_dir / f"{cam_id}.json"
+        content = json.dumps(zones, indent=2, ensure_ascii=False)
+        # Не перезаписываем неизменившийся файл — иначе ZoneManager перекомпилирует зоны при каждом старте
+        if not path.exists() or path.read_text(encoding="utf-8") != content:
+            path.write_text(content, encoding="utf-8")
+        sources[cam_id] = url
+
+    logger.info(f"[Synthetic] {count} synthetic cameras, zones in {zones_dir}")
+    return sources
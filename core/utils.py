@@ -24,6 +24,29 @@ def compute_iou(boxA, boxB):
     return inter_area / float(areaA + areaB - inter_area)
 
 
+def scale_box(box, factor):
+    """
+    Масштабирует координаты бокса.
+    :param box: (x1, y1, x2, y2)
+    :param factor: коэффициент масштаба
+    :return: [x1, y1, x2, y2] — целые координаты
+    """
+    if factor == 1.0:
+        return list(box[:4])
+    return [int(round(v * factor)) for v in box[:4]]
+
+
+def rescale_detections(detections, factor):
+    """
+    Переводит детекции в другой масштаб (например, из кадра инференса в исходное разрешение).
+    :param detections: список [(x1, y1, x2, y2, cls_id, conf)]
+    :return: список детекций в том же формате
+    """
+    if factor == 1.0:
+        return detections
+    return [(*scale_box(det, factor), *det[4:]) for det in detections]
+
+
 def expand_box(x1, y1, x2, y2, scale=1.1):
     """
     Увеличивает размеры бокса на scale, сохраняя центр.
@@ -3,27 +3,48 @@ import asyncio
 import time
 import logging
 
+from core.preprocessing import FramePreprocessor
+from core.frame_pool import FramePool
+from core.synthetic import SyntheticCapture, is_synthetic
+from core.ffmpeg_capture import FFmpegCapture
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("VideoStream")
 
 class VideoStream:
-    def __init__(self, source_url, apply_clahe=True, reconnect_delay=5):
+    def __init__(self, source_url, apply_clahe=True, reconnect_delay=5, preprocessor=None, decoder=None):
         """
-        :param source_url: str — URL камеры (RTSP/HTTP/файл)
+        :param source_url: str — URL камеры (RTSP/HTTP/файл или synthetic://WxH@fps?cars=N для нагрузочных тестов)
         :param apply_clahe: bool — применять ли CLAHE для улучшения качества
         :param reconnect_delay: int — пауза между попытками переподключения при ошибке
+        :param preprocessor: FramePreprocessor — предобработка кадров камеры (по умолчанию CLAHE по apply_clahe)
+        :param decoder: dict параметров декодера (decoder_options): backend opencv / ffmpeg и параметры ffmpeg
+
+        Кадры выдаются из пула буферов камеры (атрибут pool): get_frame передаёт владение вызывающему,
+        который обязан вернуть кадр через pool.release.
         """
         self.source_url = source_url
         self.apply_clahe = apply_clahe
         self.reconnect_delay = reconnect_delay
+        self.preprocessor = preprocessor or FramePreprocessor(clahe="on" if apply_clahe else "off")
+        self.decoder = dict(decoder or {})
+        self.pool = FramePool()
+        self._raw = None  # буфер декодера, если кадр нужно масштабировать
+        self._raw_shape = None  # форма последнего декодированного кадра
         self.cap = None
         self.connected = False
         self.last_read_success = time.time()
+        self.last_frame_info = None  # (source_url, номер кадра в источнике) последнего выданного кадра
 
     def _connect(self):
         if self.cap is not None:
             self.cap.release()
-        self.cap = cv2.VideoCapture(self.source_url)
+        if is_synthetic(self.source_url):
+            self.cap = SyntheticCapture(self.source_url)
+        elif self.decoder.get("backend") == "ffmpeg":
+            self.cap = FFmpegCapture(self.source_url, **self.decoder)
+        else:
+            self.cap = cv2.VideoCapture(self.source_url)
         self.connected = self.cap.isOpened()
         if self.connected:
             logger.info(f"[VideoStream] Connected to {self.source_url}")
@@ -36,8 +57,15 @@ class VideoStream:
             if not self.connected:
                 return None
 
-        ret, frame = self.cap.read()
+        # Без масштабирования декодируем прямо в буфер пула, CLAHE (если нужен) — на месте
+        direct = self._raw_shape is not None and self.preprocessor.output_shape(self._raw_shape) == self._raw_shape
+        buf = self.pool.acquire(self._raw_shape) if direct else None
+        ret, frame = self.cap.read(image=buf if direct else self._raw)
         if not ret:
+            if buf is not None:
+                self.pool.release(buf)
+            if self.finished:
+                return None  # видеофайл закончился — переподключение не нужно
             logger.warning("[VideoStream] Frame read failed, attempting reconnect...")
             self.connected = False
             self._connect()
@@ -45,20 +73,31 @@ class VideoStream:
             return None
 
         self.last_read_success = time.time()
+        self.last_frame_info = (self.source_url, int(self.cap.get(cv2.CAP_PROP_POS_FRAMES)) - 1)
+        self._raw_shape = frame.shape
 
-        if self.apply_clahe:
-            frame = self._apply_clahe(frame)
+        if buf is not None and frame is buf:
+            return self.preprocessor.process(buf, dst=buf)
+        if buf is not None:
+            self.pool.release(buf)  # размер кадра сменился — декодер выделил новый массив
+        else:
+            self._raw = frame
+        out = self.pool.acquire(self.preprocessor.output_shape(frame.shape))
+        return self.preprocessor.process(frame, dst=out)
 
-        return frame
+    @property
+    def finished(self):
+        """Видеофайл дочитан до конца (для потоков всегда False)."""
+        if self.cap is None or not self.cap.isOpened():
+            return False
+        total = self.cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        return total > 0 and self.cap.get(cv2.CAP_PROP_POS_FRAMES) >= total
 
-    def _apply_clahe(self, frame):
-        """Повышение контрастности с помощью CLAHE"""
-        lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
-        l, a, b = cv2.split(lab)
-        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-        cl = clahe.apply(l)
-        merged = cv2.merge((cl, a, b))
-        return cv2.cvtColor(merged, cv2.COLOR_LAB2BGR)
+    @property
+    def scale(self):
+        """Коэффициент масштаба выдаваемых кадров относительно исходного разрешения камеры."""
+        # ffmpeg может уменьшать кадр ещё в декодере
+        return getattr(self.cap, "scale", 1.0) * self.preprocessor.scale
 
     async def get_frame(self):
         """Асинхронно получить кадр (через executor)"""
@@ -1,22 +1,30 @@
 import cv2
 import numpy as np
 
-def draw_parking_zones(frame, zones, occupancy_status):
+from core.utils import scale_box
+
+def draw_parking_zones(frame, zones, occupancy_status, scale=1.0):
     """
     Отображает зоны парковки и их статус поверх кадра.
     
     :param frame: исходный кадр (numpy.ndarray)
-    :param zones: словарь {slot_id: [x1, y1, x2, y2]}
+    :param zones: словарь {slot_id: {"coords": [x1, y1, x2, y2], "polygon": [[x, y], ...]?}}
     :param occupancy_status: словарь {slot_id: bool} — True: свободно, False: занято
+    :param scale: масштаб кадра относительно координат зон
     :return: аннотированный кадр
     """
     for slot_id, zone_data in zones.items():
-        x1, y1, x2, y2 = zone_data["coords"]
+        x1, y1, x2, y2 = scale_box(zone_data["coords"], scale)
         is_free = occupancy_status.get(slot_id, True)
         color = (0, 255, 0) if is_free else (0, 0, 255)  # зелёный / красный
         label = f"{slot_id} {'Free' if is_free else 'Occupied'}"
 
-        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        polygon = zone_data.get("polygon")
+        if polygon:
+            pts = np.round(np.array(polygon, dtype=np.float32) * scale).astype(np.int32)
+            cv2.polylines(frame, [pts], True, color, 2)
+        else:
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
         cv2.putText(frame, label, (x1, y1 - 6),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
 
@@ -0,0 +1,131 @@
+import numpy as np
+
+
+def polygon_bbox(polygon):
+    """
+    :param polygon: [[x, y], ...]
+    :return: [x1, y1, x2, y2] — описывающий прямоугольник
+    """
+    xs = [int(p[0]) for p in polygon]
+    ys = [int(p[1]) for p in polygon]
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+
+def fill_polygon(labels, polygon, value):
+    """
+    Растеризация полигона по центрам пикселей: пиксель (x, y) закрашивается, если точка
+    (x + 0.5, y + 0.5) лежит внутри полигона (правило чётности). Граница полуоткрытая, как у среза
+    labels[y1:y2, x1:x2] для бокса, поэтому бокс, точно покрывающий прямоугольный полигон,
+    пересекается со всеми его пикселями и только с ними (cv2.fillPoly закрашивает границу включительно
+    и завышает площадь на строку и столбец пикселей).
+
+    :param labels: numpy.ndarray (H, W) — карта меток, изменяется на месте
+    :param polygon: numpy.ndarray (K, 2) — вершины в координатах карты (дробные)
+    :param value: метка полигона
+    """
+    h, w = labels.shape
+    x0, y0 = polygon[:, 0], polygon[:, 1]
+    x1, y1 = np.roll(x0, -1), np.roll(y0, -1)
+    rows = np.arange(max(0, int(np.floor(y0.min()))), min(h, int(np.ceil(y0.max()))))
+    if not len(rows):
+        return
+    cy = rows[:, None] + 0.5
+    crosses = (y0[None, :] <= cy) != (y1[None, :] <= cy)  # строка × ребро: ребро пересекает центр строки
+    dy = np.where(y1 != y0, y1 - y0, 1.0)
+    xs = np.where(crosses, x0[None, :] + (cy - y0[None, :]) * ((x1 - x0) / dy)[None, :], np.inf)
+    xs.sort(axis=1)
+    for row, row_xs in zip(rows, xs):
+        row_xs = row_xs[:np.count_nonzero(np.isfinite(row_xs))]
+        for xa, xb in zip(row_xs[0::2], row_xs[1::2]):
+            # Пиксели, чей центр x + 0.5 попадает в [xa, xb)
+            start, stop = max(0, int(np.ceil(xa - 0.5))), min(w, int(np.ceil(xb - 0.5)))
+            if stop > start:
+                labels[row, start:stop] = value
+
+
+class ZoneGeometry:
+    def __init__(self, zones, mask_scale=0.25):
+        """
+        Предвычисленная геометрия всех зон камеры для векторизованной оценки IoU.
+
+        Прямоугольные зоны сравниваются с детекциями аналитически (матрица IoU одним проходом numpy).
+        Полигональные зоны один раз растеризуются в карту меток уменьшенного разрешения;
+        пересечение бокса детекции со всеми полигонами — это bincount меток внутри бокса,
+        поэтому стоимость кадра не зависит от числа вершин полигонов.
+        Перекрывающиеся полигоны делят общие пиксели: пиксель достаётся зоне, описанной позже.
+
+        :param zones: словарь зон {slot_id: {"coords": [x1, y1, x2, y2], "polygon": [[x, y], ...]?}}
+        :param mask_scale: масштаб карты меток относительно координат зон
+        """
+        self.zones = zones  # исходный словарь — по нему ZoneManager проверяет актуальность геометрии
+        self.slot_ids = list(zones)
+        self.mask_scale = mask_scale
+        self.boxes = np.array([zones[s]["coords"] for s in self.slot_ids], dtype=np.float32).reshape(-1, 4)
+        self.box_areas = (self.boxes[:, 2] - self.boxes[:, 0]) * (self.boxes[:, 3] - self.boxes[:, 1])
+
+        self.poly_index = np.array([i for i, s in enumerate(self.slot_ids) if zones[s].get("polygon")], dtype=np.int64)
+        self.labels = None
+        self.poly_areas = None
+        if len(self.poly_index):
+            self._rasterize([zones[self.slot_ids[i]]["polygon"] for i in self.poly_index])
+
+    def _rasterize(self, polygons):
+        extent = self.boxes[self.poly_index, 2:].max(axis=0)
+        w = int(np.ceil(extent[0] * self.mask_scale)) + 1
+        h = int(np.ceil(extent[1] * self.mask_scale)) + 1
+        self.labels = np.zeros((h, w), dtype=np.int32)  # 0 — фон, k + 1 — k-й полигон
+        for k, polygon in enumerate(polygons):
+            fill_polygon(self.labels, np.array(polygon, dtype=np.float64) * self.mask_scale, k + 1)
+        self.poly_areas = np.bincount(self.labels.ravel(), minlength=len(polygons) + 1)[1:].astype(np.float32)
+
+    def iou_matrix(self, detections):
+        """
+        :param detections: список [(x1, y1, x2, y2, cls_id, conf)] в координатах зон
+        :return: numpy.ndarray (N зон, M детекций) — IoU
+        """
+        n = len(self.slot_ids)
+        if n == 0 or not detections:
+            return np.zeros((n, len(detections)), dtype=np.float32)
+
+        dets = np.array([d[:4] for d in detections], dtype=np.float32)
+        det_areas = (dets[:, 2] - dets[:, 0]) * (dets[:, 3] - dets[:, 1])
+
+        ix1 = np.maximum(self.boxes[:, None, 0], dets[None, :, 0])
+        iy1 = np.maximum(self.boxes[:, None, 1], dets[None, :, 1])
+        ix2 = np.minimum(self.boxes[:, None, 2], dets[None, :, 2])
+        iy2 = np.minimum(self.boxes[:, None, 3], dets[None, :, 3])
+        inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+        union = self.box_areas[:, None] + det_areas[None, :] - inter
+        iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+        if self.labels is not None:
+            iou[self.poly_index] = self._polygon_iou(dets)
+        return iou
+
+    def _polygon_iou(self, dets):
+        h, w = self.labels.shape
+        n_poly = len(self.poly_index)
+        # Пиксели бокса — по тому же правилу центров, что и у полигонов (fill_polygon),
+        # площадь — в пикселях карты: бокс, совпадающий с прямоугольным полигоном, даёт IoU = 1
+        pixels = np.ceil(dets * self.mask_scale - 0.5).astype(np.int64)
+        det_areas = (np.clip(pixels[:, 2] - pixels[:, 0], 0, None) *
+                     np.clip(pixels[:, 3] - pixels[:, 1], 0, None)).astype(np.float32)
+        pixels[:, [0, 2]] = np.clip(pixels[:, [0, 2]], 0, w)
+        pixels[:, [1, 3]] = np.clip(pixels[:, [1, 3]], 0, h)
+
+        iou = np.zeros((n_poly, len(dets)), dtype=np.float32)
+        for j, (x1, y1, x2, y2) in enumerate(pixels):
+            if x2 <= x1 or y2 <= y1:
+                continue
+            inter = np.bincount(self.labels[y1:y2, x1:x2].ravel(), minlength=n_poly + 1)[1:]
+            det_area = det_areas[j]
+            union = self.poly_areas + det_area - inter
+            iou[:, j] = np.divide(inter, union, out=np.zeros(n_poly, dtype=np.float32), where=union > 0)
+        return iou
+
+    def max_iou(self, detections):
+        """:return: numpy.ndarray (N,) — максимальный IoU каждой зоны по всем детекциям"""
+        iou = self.iou_matrix(detections)
+        if iou.shape[1] == 0:
+            return np.zeros(len(self.slot_ids), dtype=np.float32)
+        return iou.max(axis=1)
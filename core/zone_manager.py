@@ -3,41 +3,181 @@ import os
 from pathlib import Path
 import logging
 
+import numpy as np
+
 from core.utils import compute_iou
+from core.zone_geometry import ZoneGeometry, polygon_bbox
+from core.occupancy_delta import IncrementalOccupancy
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("ZoneManager")
 
+COMPILED_DIR = ".cache"  # скомпилированные зоны: {zones_dir}/.cache/{cam_id}.npz
+COMPILED_VERSION = 1
+BASE_FIELDS = ("name", "coords", "trust")
+
+def make_zone(name, coords, trust, extra=None):
+    """Единый вид зоны — одинаковый при загрузке из json и из скомпилированного файла."""
+    zone = {"name": name, "coords": [int(v) for v in coords], "trust": float(trust)}
+    if extra:
+        zone.update(extra)
+    return zone
+
+
 class ZoneManager:
-    def __init__(self, zones_dir="config/zones", iou_threshold=0.5):
+    def __init__(self, zones_dir="config/zones", iou_threshold=0.5, roi_classifier=None, mask_scale=0.25):
         """
         :param zones_dir: папка с json-файлами зон парковки для каждой камеры
         :param iou_threshold: порог для определения занятости (IoU)
+        :param roi_classifier: RoiOccupancyClassifier — если задан, занятость определяется по ROI вместо IoU
+        :param mask_scale: масштаб карты меток для полигональных зон
         """
         self.zones_dir = Path(zones_dir)
         self.zones_dir.mkdir(parents=True, exist_ok=True)
         self.iou_threshold = iou_threshold
+        self.roi_classifier = roi_classifier
         self.zone_map = {}  # cam_id → {slot_id: [x1, y1, x2, y2]}
         self.trust_map = {}  # (cam_id, slot_id) → trust
+        self.frame_scales = {}  # cam_id → масштаб обрабатываемого кадра относительно координат зон
+        self.source_stats = {}  # cam_id → (mtime_ns, size) json-файла, из которого загружены зоны
+        self.mask_scale = mask_scale
+        self.geometry = {}  # cam_id → ZoneGeometry
+        self.deltas = {}  # cam_id → IncrementalOccupancy (инкрементальный режим)
 
-    def load_zones(self, cam_id):
-        path = self.zones_dir / f"{cam_id}.json"
+    def zones_path(self, cam_id):
+        return self.zones_dir / f"{cam_id}.json"
+
+    def compiled_path(self, cam_id):
+        return self.zones_dir / COMPILED_DIR / f"{cam_id}.npz"
+
+    def source_stat(self, cam_id):
+        """:return: (mtime_ns, size) json-файла зон или None, если файла нет"""
+        try:
+            stat = os.stat(self.zones_path(cam_id))
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def compile_zones(self, cam_id, zones, source_stat):
+        """
+        Сохраняет зоны в компактном бинарном виде: массивы координат и trust.
+        Редкие дополнительные поля зоны хранятся как JSON-строки.
+        """
+        slot_ids = list(zones)
+        extras = []
+        for slot_id in slot_ids:
+            extra = {k: v for k, v in zones[slot_id].items() if k not in BASE_FIELDS}
+            extras.append(json.dumps(extra, ensure_ascii=False) if extra else "")
+
+        path = self.compiled_path(cam_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.stem + ".tmp.npz")
+        np.savez(tmp_path,
+                 version=np.int32(COMPILED_VERSION),
+                 source_stat=np.array(source_stat, dtype=np.int64),
+                 slot_ids=np.array(slot_ids, dtype=str),
+                 names=np.array([zones[s].get("name", "") for s in slot_ids], dtype=str),
+                 coords=np.array([zones[s]["coords"] for s in slot_ids], dtype=np.int32).reshape(-1, 4),
+                 trust=np.array([zones[s].get("trust", 0.5) for s in slot_ids], dtype=np.float64),
+                 extras=np.array(extras, dtype=str))
+        os.replace(tmp_path, path)
+
+    def _load_compiled(self, cam_id, source_stat):
+        path = self.compiled_path(cam_id)
         if not path.exists():
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data["version"]) != COMPILED_VERSION or tuple(data["source_stat"]) != source_stat:
+                    return None
+                slot_ids, names, extras = data["slot_ids"].tolist(), data["names"].tolist(), data["extras"].tolist()
+                coords, trust = data["coords"].tolist(), data["trust"].tolist()
+        except (OSError, ValueError, KeyError):
+            logger.warning(f"[ZoneManager] Compiled zones for {cam_id} are corrupted, recompiling")
+            return None
+
+        # Значения в файле уже нормализованы — собираем словари напрямую, без make_zone
+        zones = {
+            slot_id: {"name": name, "coords": box, "trust": slot_trust}
+            for slot_id, name, box, slot_trust in zip(slot_ids, names, coords, trust)
+        }
+        for slot_id, extra in zip(slot_ids, extras):
+            if extra:
+                zones[slot_id].update(json.loads(extra))
+        return zones
+
+    def _read_zones(self, cam_id, source_stat):
+        zones = self._load_compiled(cam_id, source_stat)
+        if zones is not None:
+            return zones
+
+        with open(self.zones_path(cam_id), "r", encoding="utf-8") as f:
+            raw_zones = json.load(f)
+
+        # Для полигональных зон coords — описывающий прямоугольник (ROI, подписи, события)
+        zones = {
+            slot_id: make_zone(data.get("name", ""), data.get("coords") or polygon_bbox(data["polygon"]),
+                               data.get("trust", 0.5), {k: v for k, v in data.items() if k not in BASE_FIELDS})
+            for slot_id, data in raw_zones.items()
+        }
+        try:
+            self.compile_zones(cam_id, zones, source_stat)
+        except OSError as e:
+            # Кэш — только ускорение: без него зоны по-прежнему загружаются из json
+            logger.warning(f"[ZoneManager] Cannot write compiled zones for {cam_id}: {e}")
+        return zones
+
+    def load_zones(self, cam_id):
+        source_stat = self.source_stat(cam_id)
+        if source_stat is None:
             logger.warning(f"[ZoneManager] Zones for {cam_id} not found")
-            self.zone_map[cam_id] = {}
+            self._set_camera_zones(cam_id, {})
+            self.source_stats[cam_id] = None
             return
 
-        with open(path, "r", encoding="utf-8") as f:
-            zones = json.load(f)
-            self.zone_map[cam_id] = zones
+        zones = self._read_zones(cam_id, source_stat)
+
+        # 📥 Заполняем trust_map из файла (trust уже нормализован: по умолчанию 0.5)
+        self.trust_map.update(((cam_id, slot_id), data["trust"]) for slot_id, data in zones.items())
 
-            # 📥 Заполняем trust_map из файла
-            for slot_id, data in zones.items():
-                trust = data.get("trust", 0.5)  # если trust не указан — берём 0.5
-                self.trust_map[(cam_id, slot_id)] = trust
+        self._set_camera_zones(cam_id, zones)
+        self.source_stats[cam_id] = source_stat
 
         logger.info(f"[ZoneManager] Loaded {len(self.zone_map[cam_id])} zones for {cam_id}")
 
+    def _set_camera_zones(self, cam_id, zones):
+        # Геометрия строится заранее, подмена — присваиванием: обработчик камеры
+        # видит либо старые, либо новые зоны целиком
+        geometry = ZoneGeometry(zones, mask_scale=self.mask_scale)
+        self.zone_map[cam_id] = zones
+        self.geometry[cam_id] = geometry
+
+    def reload_zones(self, cam_id):
+        """
+        Перечитывает зоны камеры и сообщает, что изменилось.
+        :return: (added, removed, changed) — множества slot_id
+        """
+        old = self.zone_map.get(cam_id, {})
+        self.load_zones(cam_id)
+        new = self.zone_map[cam_id]
+
+        added = set(new) - set(old)
+        removed = set(old) - set(new)
+        changed = {slot_id for slot_id in set(old) & set(new) if old[slot_id] != new[slot_id]}
+        for slot_id in removed:
+            self.trust_map.pop((cam_id, slot_id), None)
+        return added, removed, changed
+
+    def unload_zones(self, cam_id):
+        """Забывает зоны, trust и геометрию камеры, которая больше не обрабатывается."""
+        self.zone_map.pop(cam_id, None)
+        self.geometry.pop(cam_id, None)
+        self.source_stats.pop(cam_id, None)
+        self.frame_scales.pop(cam_id, None)
+        self.deltas.pop(cam_id, None)
+        for key in [key for key in self.trust_map if key[0] == cam_id]:
+            del self.trust_map[key]
+
     def save_zones(self, cam_id):
         path = self.zones_dir / f"{cam_id}.json"
         with open(path, "w", encoding="utf-8") as f:
@@ -48,9 +188,16 @@ class ZoneManager:
         return self.zone_map.get(cam_id, {})
 
     def set_zones(self, cam_id, zones_dict):
-        self.zone_map[cam_id] = zones_dict
+        self._set_camera_zones(cam_id, zones_dict)
         self.save_zones(cam_id)
 
+    def get_geometry(self, cam_id):
+        zones = self.get_zones(cam_id)
+        geometry = self.geometry.get(cam_id)
+        if geometry is None or geometry.zones is not zones:
+            geometry = self.geometry[cam_id] = ZoneGeometry(zones, mask_scale=self.mask_scale)
+        return geometry
+
     def get_trust(self, cam_id, slot_id):
         trust = self.trust_map.get((cam_id, slot_id))
         if trust is None:
@@ -58,6 +205,12 @@ class ZoneManager:
             trust = 0.5
         return trust
 
+    def set_frame_scale(self, cam_id, scale):
+        self.frame_scales[cam_id] = scale
+
+    def get_frame_scale(self, cam_id):
+        return self.frame_scales.get(cam_id, 1.0)
+
     def is_occupied(self, slot_box, detections):
         """
         Проверка, занята ли зона на основе списка детекций.
@@ -67,13 +220,38 @@ class ZoneManager:
         """
         return any(compute_iou(slot_box, det[:4]) >= self.iou_threshold for det in detections)
 
-    def analyze_occupancy(self, cam_id, detections):
+    def analyze_occupancy(self, cam_id, detections, frame=None):
         """
-        Анализ занятости всех зон по детекциям объектов.
+        Анализ занятости всех зон по детекциям объектов (детекции — в координатах зон).
+        Если задан roi_classifier и передан кадр — зоны классифицируются по ROI, детекции не нужны.
         :return: словарь {slot_id: True (свободно) / False (занято)}
         """
         zones = self.get_zones(cam_id)
-        return {
-            slot_id: not self.is_occupied(slot_data["coords"], detections)
-            for slot_id, slot_data in zones.items()
-        }
+        if self.roi_classifier is not None and frame is not None:
+            return self.roi_classifier.predict(frame, zones, scale=self.get_frame_scale(cam_id))
+
+        geometry = self.get_geometry(cam_id)
+        occupied = geometry.max_iou(detections) >= self.iou_threshold
+        return {slot_id: not bool(is_occupied) for slot_id, is_occupied in zip(geometry.slot_ids, occupied)}
+
+    def analyze_occupancy_delta(self, cam_id, detections, frame=None, tolerance=4.0):
+        """
+        Инкрементальный вариант analyze_occupancy: детекции сопоставляются с прошлым кадром,
+        пересчитываются только места, задетые появившимися, исчезнувшими или сдвинувшимися боксами.
+        :param tolerance: допуск сопоставления боксов, пикселей в координатах зон
+        :return: (status, full) — full=False: status содержит только места, чья занятость изменилась;
+                 full=True: статус всех мест (первый кадр, смена разметки или ROI-классификатор)
+        """
+        if self.roi_classifier is not None and frame is not None:
+            return self.analyze_occupancy(cam_id, detections, frame=frame), True
+
+        geometry = self.get_geometry(cam_id)
+        delta = self.deltas.get(cam_id)
+        full = delta is None or delta.geometry is not geometry or delta.tolerance != tolerance
+        if full:
+            delta = self.deltas[cam_id] = IncrementalOccupancy(geometry, self.iou_threshold, tolerance)
+        return delta.update(detections, full=full), full
+
+    def reset_delta(self, cam_id):
+        """Следующий вызов analyze_occupancy_delta вернёт статус всех мест камеры."""
+        self.deltas.pop(cam_id, None)
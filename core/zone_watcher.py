@@ -0,0 +1,59 @@
+import asyncio
+import logging
+
+logger = logging.getLogger("ZoneWatcher")
+
+
+class ZoneWatcher:
+    def __init__(self, zone_manager, analyzer, aggregator, interval=2.0):
+        """
+        Горячая перезагрузка разметки: следит за config/zones/{cam_id}.json загруженных камер.
+
+        :param zone_manager: экземпляр ZoneManager
+        :param analyzer: экземпляр OccupancyAnalyzer — состояние фильтра удалённых/изменённых мест сбрасывается
+        :param aggregator: экземпляр GlobalAggregator — отчёты по удалённым местам удаляются
+        :param interval: период проверки файлов, сек
+        """
+        self.zone_manager = zone_manager
+        self.analyzer = analyzer
+        self.aggregator = aggregator
+        self.interval = interval
+        self.failed_stats = {}  # cam_id → stat файла, который не удалось разобрать (чтобы не спамить в лог)
+
+    def check(self):
+        """Проверяет все загруженные камеры и перезагружает изменившиеся зоны."""
+        for cam_id in list(self.zone_manager.zone_map):
+            try:
+                current = self.zone_manager.source_stat(cam_id)
+            except OSError as e:
+                logger.warning(f"[ZoneWatcher] Cannot stat zones of {cam_id}: {e}")
+                continue
+            if current == self.zone_manager.source_stats.get(cam_id) or current == self.failed_stats.get(cam_id):
+                continue
+
+            try:
+                added, removed, changed = self.zone_manager.reload_zones(cam_id)
+            except (ValueError, KeyError, TypeError) as e:
+                # Файл мог быть сохранён редактором не до конца — оставляем прежние зоны
+                self.failed_stats[cam_id] = current
+                logger.warning(f"[ZoneWatcher] Failed to reload zones for {cam_id}: {e}")
+                continue
+            except OSError as e:
+                # Файл заменён или удалён между stat и open (атомарное сохранение редактором), нет прав —
+                # оставляем прежние зоны; изменившийся файл будет перечитан на следующей проверке
+                logger.warning(f"[ZoneWatcher] Failed to read zones for {cam_id}: {e}")
+                continue
+
+            self.failed_stats.pop(cam_id, None)
+            self.analyzer.drop_slots(cam_id, removed | changed)
+            self.aggregator.drop_reports(cam_id, removed)
+            logger.info(f"[ZoneWatcher] Reloaded zones for {cam_id}: "
+                        f"+{len(added)} added, -{len(removed)} removed, ~{len(changed)} changed")
+
+    async def run(self, stop_event):
+        while not stop_event.is_set():
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.check()
@@ -1,7 +1,13 @@
+import time
+STARTUP_TIME = time.perf_counter()  # точка отсчёта для time-to-first-decision
+
+import argparse
 import asyncio
 import cv2
 import logging
 import signal
+import struct
+from collections import Counter
 
 from pathlib import Path
 from omegaconf import OmegaConf
@@ -10,14 +16,24 @@ from colorama import Fore, Style, init
 init(autoreset=True)
 
 from core.video_stream import VideoStream
+from core.preprocessing import FramePreprocessor
+from core.ffmpeg_capture import decoder_options
 from core.detector import ObjectDetector
+from core.detection_cache import DetectionCache
+from core.synthetic import SyntheticDetector, build_synthetic_cameras
+from core.cascade import CascadeDetector
+from core.qos import QosController, LEVEL_NAMES
 from core.zone_manager import ZoneManager
+from core.zone_watcher import ZoneWatcher
 from core.occupancy_analyzer import OccupancyAnalyzer
 from core.visualizer import draw_parking_zones, draw_detections
-from core.dashboard import StatusDashboard
 from core.aggregator import GlobalAggregator
+from core.state_snapshot import StateSnapshotter
+from core.status_api import StatusPublisher, StatusServer
+from core.cluster import ClusterWorker, ClusterAggregatorServer, cameras_for_node
 from core.display_board import DisplayBoard
 from core.event_logger import log_slot_event
+from core.utils import rescale_detections, scale_box
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("Main")
@@ -30,15 +46,83 @@ LOG_DIR.mkdir(parents=True, exist_ok=True)
 IMG_LOG_DIR.mkdir(parents=True, exist_ok=True)
 
 
-async def print_aggregated_status_periodically(aggregator, stop_event, interval=5):
+async def print_aggregated_status_periodically(publisher, stop_event, interval=5, detection_cache=None,
+                                               cascade=None, qos=None, throughput=None, console="delta"):
+    last_counts, last_time = {}, time.perf_counter()
+    printed_version = None
     while not stop_event.is_set():
         await asyncio.sleep(interval)
-        print(f"\n{Fore.YELLOW}[INFO]{Style.RESET_ALL} Aggregated Parking Status (live):")
-        aggregated = aggregator.get_aggregated_status()
-        for slot_id, is_free in aggregated.items():
-            color = Fore.GREEN if is_free else Fore.RED
-            status = "Free" if is_free else "Occupied"
-            print(f"{slot_id}: {color}{status}{Style.RESET_ALL}")
+        # delta — только места, изменившиеся с прошлого вывода; полный список — при первом выводе
+        # или если нужные изменения уже вытеснены из истории издателя
+        changes = {}
+        if console == "delta" and printed_version is not None:
+            changes = publisher.changes_since(printed_version)
+            title = f"Parking Status changes (v{publisher.version}):"
+        if console == "full" or (console == "delta" and (printed_version is None or changes is None)):
+            changes = publisher.status
+            title = "Aggregated Parking Status (live):"
+        if changes:
+            print(f"\n{Fore.YELLOW}[INFO]{Style.RESET_ALL} {title}")
+            for slot_id, is_free in changes.items():
+                color = Fore.GREEN if is_free else Fore.RED
+                status = "Free" if is_free else ("Occupied" if is_free is not None else "Removed")
+                print(f"{slot_id}: {color}{status}{Style.RESET_ALL}")
+        printed_version = publisher.version
+
+        if throughput is not None:
+            # Разница по камерам, а не по сумме: счётчик остановленной камеры удаляется из throughput
+            now = time.perf_counter()
+            decisions = sum(count - last_counts.get(cam_id, 0) for cam_id, count in throughput.items())
+            rate = decisions / (now - last_time)
+            logger.info(f"[Throughput] {rate:.1f} decisions/s across {len(throughput)} cameras "
+                        f"({rate / max(1, len(throughput)):.2f} per camera)")
+            last_counts, last_time = dict(throughput), now
+
+        if detection_cache:
+            for cam_id, stats in sorted(detection_cache.get_stats().items()):
+                logger.info(f"[DetectionCache] {cam_id}: hit ratio {stats['hit_ratio']:.1%} "
+                            f"({stats['hits']} hits / {stats['misses']} misses)")
+
+        if cascade:
+            for cam_id, stats in sorted(cascade.get_stats().items()):
+                logger.info(f"[Cascade] {cam_id}: escalation rate {stats['escalation_rate']:.1%} "
+                            f"({stats['escalations']} / {stats['frames']} frames)")
+
+        if qos:
+            logger.info(f"[QoS] Level {qos.level}: {LEVEL_NAMES[qos.level]}")
+            for cam_id, stats in sorted(qos.get_stats().items()):
+                logger.info(f"[QoS] {cam_id}: priority {stats['priority']}, staleness {stats['staleness']:.2f}s, "
+                            f"slack {stats['slack']:+.2f}s, skipped {stats['skipped']} frames"
+                            f"{'' if stats['connected'] else ', no frames'}")
+
+
+async def checkpoint_state_periodically(snapshotter, analyzer, aggregator, stop_event, interval=5.0):
+    while not stop_event.is_set():
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+        try:
+            snapshotter.save(analyzer, aggregator)
+        except (OSError, struct.error, ValueError) as e:
+            # Сбой одной записи (диск, права) не должен останавливать периодические снимки
+            logger.warning(f"[StateSnapshot] Failed to save snapshot: {e}")
+
+
+async def expire_stale_state_periodically(aggregator, analyzer, stop_event, interval=10.0):
+    while not stop_event.is_set():
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+        for cam_id in aggregator.expire():
+            analyzer.drop_camera(cam_id)
+
+
+async def update_qos_periodically(qos, stop_event, interval=0.5):
+    while not stop_event.is_set():
+        await asyncio.sleep(interval)
+        qos.update()
 
 
 import threading
@@ -59,39 +143,78 @@ def render_display_loop(stop_event, display_board):
 
 
 async def process_camera(cam_id, cam_cfg, detector, zone_manager, analyzer, aggregator,
-                         mode, stop_event, display_board, test_video_path=None):
+                         mode, stop_event, display_board, test_video_path=None, preprocessing_cfg=None, qos=None,
+                         decoder_cfg=None,
+                         record=True, throughput=None, console="delta"):
     logger.info(f"[{cam_id}] Starting in mode: {mode}")
 
     source = test_video_path if mode == "video" else cam_cfg.url
-    stream = VideoStream(source)
+    stream = VideoStream(source, preprocessor=FramePreprocessor.from_config(preprocessing_cfg, cam_id),
+                         decoder=decoder_options(decoder_cfg, cam_id))
+    # Детектору-заглушке нужен поток камеры: по нему он знает, какой кадр сцены обрабатывается
+    attach_stream = getattr(detector, "attach_stream", None)
+    if attach_stream:
+        attach_stream(cam_id, stream)
     zone_manager.load_zones(cam_id)
-    zones = zone_manager.get_zones(cam_id)
 
     output_path = Path(f"tests/output/{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}_{cam_id}_annotated.avi")
     output_path.parent.mkdir(parents=True, exist_ok=True)
     writer = None
 
+    # from core.dashboard import StatusDashboard  # tkinter импортируется только при включении дашборда
     # dashboard = StatusDashboard()
     last_statuses = {}
+    known_zones = None
+    first_decision = True
+    if qos:
+        qos.register(cam_id)
 
     while not stop_event.is_set():
         frame = await stream.get_frame()
         if frame is None:
+            if mode == "video" and stream.finished:
+                logger.info(f"[{cam_id}] End of test video")
+                break
+            if qos:
+                qos.mark_disconnected(cam_id)
             await asyncio.sleep(0.05)
             continue
+        if qos:
+            qos.mark_connected(cam_id)
 
-        if writer is None:
+        if writer is None and record:
             h, w = frame.shape[:2]
             writer = cv2.VideoWriter(str(output_path), cv2.VideoWriter_fourcc(*'XVID'), 10, (w, h))
 
-        detections = detector.detect(frame)
-        status = analyzer.analyze(cam_id, detections)
+        # Зоны могут быть подменены ZoneWatcher-ом между кадрами
+        zones = zone_manager.get_zones(cam_id)
+        if zones is not known_zones:
+            known_zones = zones
+            for slot_id in [s for s in last_statuses if s not in zones]:
+                del last_statuses[slot_id]
+
+        if qos and not qos.should_process(cam_id):
+            stream.pool.release(frame)
+            if mode == "video" and stream.finished:
+                logger.info(f"[{cam_id}] End of test video")
+                break
+            continue
+
+        # Детекции — в координатах кадра, анализ зон — в исходном разрешении камеры
+        scale = stream.scale
+        zone_manager.set_frame_scale(cam_id, scale)
+        imgsz = qos.inference_size(cam_id) if qos else None
+        detections = detector.detect(frame, cam_id=cam_id, imgsz=imgsz) if detector else []
+        status = analyzer.analyze(cam_id, rescale_detections(detections, 1.0 / scale), frame=frame)
 
         aggregator.update(cam_id, status)
-
-        frame = draw_detections(frame, detections)
-        frame = draw_parking_zones(frame, zones, status)
-        # dashboard.update({slot_id: status[slot_id] for slot_id in zones})
+        if qos:
+            qos.record_decision(cam_id)
+        if throughput is not None:
+            throughput[cam_id] += 1
+        if first_decision:
+            first_decision = False
+            logger.info(f"[{cam_id}] Time to first decision: {time.perf_counter() - STARTUP_TIME:.2f}s")
 
         # timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 
@@ -100,32 +223,93 @@ async def process_camera(cam_id, cam_cfg, detector, zone_manager, analyzer, aggr
             color = Fore.GREEN if is_free else Fore.RED
             state = "Free" if is_free else "Occupied"
             if prev is None:
-                print(f"[INIT]  {slot_id}: {color}{state}{Style.RESET_ALL}")
+                if console != "off":
+                    print(f"[INIT]  {slot_id}: {color}{state}{Style.RESET_ALL}")
             elif prev != is_free:
-                print(f"[UPDATE] {slot_id}: {color}{state}{Style.RESET_ALL}")
+                if console != "off":
+                    print(f"[UPDATE] {slot_id}: {color}{state}{Style.RESET_ALL}")
 
                 # логируем событие с сохранением ROI и JSON
                 zone = zones.get(slot_id)
                 if zone and "coords" in zone:
-                    log_slot_event(cam_id, slot_id, prev, is_free, frame.copy(), zone["coords"])
+                    # Запись синхронная — кадр из пула не переиспользуется, пока событие не сохранено.
+                    # Кадр ещё без разметки: ROI событий — обучающие данные классификатора, рамка статуса в них — утечка метки
+                    log_slot_event(cam_id, slot_id, prev, is_free, frame, scale_box(zone["coords"], scale))
 
             last_statuses[slot_id] = is_free
 
-        writer.write(frame)
-        if display_board:
-            display_board.update_frame(cam_id, frame)
-
-        if mode == "video" and stream.cap.get(cv2.CAP_PROP_POS_FRAMES) >= stream.cap.get(cv2.CAP_PROP_FRAME_COUNT):
+        annotate = qos.annotation_enabled(cam_id) if qos else True
+        if annotate:
+            frame = draw_detections(frame, detections)
+            frame = draw_parking_zones(frame, zones, status, scale=scale)
+            # dashboard.update({slot_id: status[slot_id] for slot_id in zones})
+            if writer:
+                writer.write(frame)
+            if display_board:
+                display_board.update_frame(cam_id, frame)
+        stream.pool.release(frame)
+
+        if mode == "video" and stream.finished:
             logger.info(f"[{cam_id}] End of test video")
             break
 
     stream.release()
     if writer:
         writer.release()
+    if display_board:
+        display_board.remove_frame(cam_id)
+    if qos:
+        qos.unregister(cam_id)
+    # Камера остановлена — её счётчики, записи кэша/каскада и поток у детектора больше не нужны
+    drop_detector_state = getattr(detector, "drop_camera", None)
+    if drop_detector_state:
+        drop_detector_state(cam_id)
+    if throughput is not None:
+        throughput.pop(cam_id, None)
     # dashboard.close()
 
 
-async def main():
+def build_detector(cfg, zone_manager):
+    """
+    Собирает цепочку детекции по конфигу: модель → каскад → кэш.
+    :return: (detector, cascade, detection_cache) — detector is None для бэкенда roi
+    """
+    backend = cfg.logic.get("occupancy_backend", "iou")
+    detector = None
+    if backend == "roi":
+        from core.roi_classifier import RoiOccupancyClassifier
+        roi_cfg = cfg.logic.get("roi_classifier", {})
+        zone_manager.roi_classifier = RoiOccupancyClassifier(roi_cfg.get("model_path", "models/roi_classifier.npz"),
+                                                             input_size=roi_cfg.get("input_size", 64))
+        print(f"{Fore.YELLOW}[INFO]{Style.RESET_ALL} Occupancy backend: ROI classifier")
+    else:
+        detector = ObjectDetector(cfg.model.path, conf_threshold=cfg.model.conf_threshold)
+        detector.warmup()
+
+    cascade_cfg = cfg.model.get("cascade", {})
+    cascade = None
+    if detector and cascade_cfg.get("enabled", False):
+        fast_detector = ObjectDetector(cascade_cfg.fast_path, conf_threshold=cfg.model.conf_threshold)
+        fast_detector.warmup()
+        cascade = CascadeDetector(fast_detector, detector, zone_manager,
+                                  escalation=dict(cascade_cfg.get("escalation", {})),
+                                  cameras=dict(cascade_cfg.get("cameras", {})))
+        detector = cascade
+
+    cache_cfg = cfg.model.get("cache", {})
+    detection_cache = None
+    if detector and cache_cfg.get("enabled", False):
+        detection_cache = DetectionCache(detector,
+                                         hash_size=cache_cfg.get("hash_size", 16),
+                                         tolerance=cache_cfg.get("tolerance", 6),
+                                         ttl_seconds=cache_cfg.get("ttl_seconds", 10.0),
+                                         max_entries=cache_cfg.get("max_entries", 32))
+        detector = detection_cache
+
+    return detector, cascade, detection_cache
+
+
+async def main(args):
     cfg = OmegaConf.load("config/config.yaml")
     mode = cfg.get("mode", "live")
 
@@ -136,18 +320,59 @@ async def main():
             cfg.test_videos[cam_id] = template.format(weather=weather)
         print(f"{Fore.YELLOW}[INFO]{Style.RESET_ALL} Using video directory for weather: {weather}")
 
-    detector = ObjectDetector(cfg.model.path, conf_threshold=cfg.model.conf_threshold)
-    zone_manager = ZoneManager(iou_threshold=cfg.logic.iou_threshold)
+    cluster_cfg = cfg.get("cluster", {})
+    role = args.role or cluster_cfg.get("role", "standalone")
+    node = args.node or cluster_cfg.get("node")
+
+    # Синтетические камеры (нагрузочный тест): сцены, зоны и детектор-заглушка генерируются по конфигу
+    synthetic_cfg = cfg.get("synthetic", {})
+    synthetic_sources = {}
+    zones_dir = "config/zones"
+    if mode == "synthetic":
+        zones_dir = synthetic_cfg.get("zones_dir", "config/zones/synthetic")
+        synthetic_sources = build_synthetic_cameras(synthetic_cfg.get("cameras", 50),
+                                                    synthetic_cfg.get("url", "synthetic://1280x720@10?cars=40&seed={index}"),
+                                                    zones_dir)
+
+    zone_manager = ZoneManager(zones_dir, iou_threshold=cfg.logic.iou_threshold,
+                               mask_scale=cfg.logic.get("mask_scale", 0.25))
+    detector = cascade = detection_cache = None
+    if mode == "synthetic" and role != "aggregator":
+        detector = SyntheticDetector(latency=synthetic_cfg.get("detector_latency", 0.0))
+    elif role != "aggregator":
+        detector, cascade, detection_cache = build_detector(cfg, zone_manager)
 
     filter_cfg = cfg.logic.get("filter", {})
     window_seconds = filter_cfg.get("window_seconds", 2.0)
     min_confirmations = filter_cfg.get("min_confirmations", 3)
+    incremental_cfg = cfg.logic.get("incremental", {})
     analyzer = OccupancyAnalyzer(zone_manager,
                                 window_seconds=window_seconds,
-                                min_confirmations=min_confirmations)
+                                min_confirmations=min_confirmations,
+                                incremental=incremental_cfg.get("enabled", False),
+                                tolerance_px=incremental_cfg.get("tolerance_px", 4.0))
+
+    aggregator = GlobalAggregator(zone_manager, report_ttl=cfg.logic.get("report_ttl_seconds", 300.0))
 
-    aggregator = GlobalAggregator(zone_manager)
-    display_board = DisplayBoard(width=1280, height=720, max_columns=2) if cfg.get("show_display", True) else None
+    persistence_cfg = cfg.get("persistence", {})
+    snapshotter = None
+    if persistence_cfg.get("enabled", False):
+        snapshotter = StateSnapshotter(persistence_cfg.get("path", "state/occupancy.snap"),
+                                       max_age_seconds=persistence_cfg.get("max_age_seconds", 300.0))
+        if snapshotter.restore(analyzer, aggregator):
+            print(f"{Fore.YELLOW}[INFO]{Style.RESET_ALL} Restored occupancy state from {snapshotter.path}")
+
+    # После восстановления снимка — издатель стартует с уже известных статусов
+    status_cfg = cfg.get("status_api", {})
+    console = status_cfg.get("console", "delta")
+    publisher = StatusPublisher(aggregator, backlog=status_cfg.get("backlog", 1024))
+
+    logger.info(f"Pipeline ready in {time.perf_counter() - STARTUP_TIME:.2f}s")
+
+    qos_cfg = cfg.get("qos", {})
+    qos = QosController.from_config(qos_cfg) if qos_cfg.get("enabled", False) else None
+    show_display = cfg.get("show_display", True) and role != "aggregator"
+    display_board = DisplayBoard(width=1280, height=720, max_columns=2) if show_display else None
 
     stop_event = asyncio.Event()
 
@@ -160,9 +385,36 @@ async def main():
 
     tasks = []
 
-    cam_sources = (
-        cfg.test_videos.items() if mode == "video" else cfg.cameras.items()
-    )
+    if mode == "video":
+        cam_sources = cfg.test_videos.items()
+    elif mode == "synthetic":
+        cam_sources = [(cam_id, OmegaConf.create({"url": url})) for cam_id, url in synthetic_sources.items()]
+    else:
+        cam_sources = cfg.cameras.items()
+    throughput = Counter()  # cam_id → число решений о занятости
+
+    nodes_cfg = {name: list(cams) for name, cams in cluster_cfg.get("nodes", {}).items()}
+    aggregator_cfg = cluster_cfg.get("aggregator", {})
+    if role == "worker":
+        node_cameras = cameras_for_node(nodes_cfg, node)
+        cam_sources = [(cam_id, cam_cfg) for cam_id, cam_cfg in cam_sources if cam_id in node_cameras]
+        worker = ClusterWorker(node, node_cameras,
+                               host=aggregator_cfg.get("host", "127.0.0.1"),
+                               port=aggregator_cfg.get("port", 8765),
+                               batch_interval=cluster_cfg.get("batch_interval", 0.2))
+        worker.attach(aggregator)
+        tasks.append(worker.run(stop_event))
+        print(f"{Fore.YELLOW}[INFO]{Style.RESET_ALL} Worker {node}: cameras {node_cameras}")
+    elif role == "aggregator":
+        # Камеры обрабатываются на worker-узлах, здесь нужны только зоны и trust всех камер
+        for cam_id in sorted({cam for cams in nodes_cfg.values() for cam in cams} | {c for c, _ in cam_sources}):
+            zone_manager.load_zones(cam_id)
+        cam_sources = []
+        server = ClusterAggregatorServer(aggregator,
+                                         host=aggregator_cfg.get("bind", "0.0.0.0"),
+                                         port=aggregator_cfg.get("port", 8765),
+                                         disconnect_grace=aggregator_cfg.get("disconnect_grace_seconds", 10.0))
+        tasks.append(server.run(stop_event))
 
     for cam_id, cam_cfg in cam_sources:
         test_video = cam_cfg if mode == "video" else None
@@ -178,14 +430,37 @@ async def main():
             mode,
             stop_event,
             display_board,
-            test_video_path=test_video
+            test_video_path=test_video,
+            preprocessing_cfg=cfg.get("preprocessing", {}),
+            decoder_cfg=cfg.get("decoder", {}),
+            qos=qos,
+            record=synthetic_cfg.get("record", False) if mode == "synthetic" else True,
+            throughput=throughput,
+            console=console
         )
         tasks.append(task)
 
-    tasks.append(print_aggregated_status_periodically(aggregator, stop_event, interval=5))
+    tasks.append(print_aggregated_status_periodically(publisher, stop_event,
+                                                      interval=status_cfg.get("console_interval", 5),
+                                                      detection_cache=detection_cache, cascade=cascade, qos=qos,
+                                                      throughput=throughput, console=console))
+    if status_cfg.get("enabled", False) and role != "worker":
+        tasks.append(StatusServer(publisher,
+                                  host=status_cfg.get("host", "127.0.0.1"),
+                                  port=status_cfg.get("port", 8080)).run(stop_event))
+    if qos:
+        tasks.append(update_qos_periodically(qos, stop_event))
+    reload_interval = cfg.logic.get("zones_reload_interval", 2.0)
+    if reload_interval:
+        tasks.append(ZoneWatcher(zone_manager, analyzer, aggregator, interval=reload_interval).run(stop_event))
+    if aggregator.report_ttl:
+        tasks.append(expire_stale_state_periodically(aggregator, analyzer, stop_event))
+    if snapshotter:
+        tasks.append(checkpoint_state_periodically(snapshotter, analyzer, aggregator, stop_event,
+                                                   interval=persistence_cfg.get("interval_seconds", 5.0)))
     # tasks.append(render_display_loop(stop_event, display_board))  # Одно окно
 
-    if cfg.get("show_display", True):
+    if show_display:
         render_thread = threading.Thread(target=render_display_loop, args=(stop_event, display_board))
         render_thread.start()
     else:
@@ -198,7 +473,11 @@ async def main():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parking occupancy monitoring")
+    parser.add_argument("--role", choices=["standalone", "worker", "aggregator"],
+                        help="роль узла (по умолчанию — cluster.role из config.yaml)")
+    parser.add_argument("--node", help="имя worker-узла из cluster.nodes")
     try:
-        asyncio.run(main())
+        asyncio.run(main(parser.parse_args()))
     except KeyboardInterrupt:
         logger.info(f"{Fore.YELLOW}[INFO]{Style.RESET_ALL} Interrupted by user. Exiting.")
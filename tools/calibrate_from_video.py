@@ -0,0 +1,56 @@
+import argparse
+
+from omegaconf import OmegaConf
+from core.calibrator import ParkingCalibrator
+from core.detector import ObjectDetector
+
+"""
+Автокалибровка мест по множеству кадров видео: детекции с сотен кадров кластеризуются
+в стабильные места с медианными боксами, частотой занятости и предлагаемым trust.
+Результат — config/zones/{cam_id}.json, который затем можно поправить в tools/mark_parkings.py.
+Запуск:
+    python -m tools.calibrate_from_video --cam cam1 --frames 300 --batch 8
+    python -m tools.calibrate_from_video --cam cam1 --video recordings/cam1_1h.mp4
+"""
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-frame parking slot calibration")
+    parser.add_argument("--cam", required=True, help="идентификатор камеры")
+    parser.add_argument("--video", help="видео или URL (по умолчанию — test_videos/cameras из config.yaml)")
+    parser.add_argument("--config", default="config/config.yaml")
+    parser.add_argument("--output-dir", default="config/zones")
+    parser.add_argument("--frames", type=int, default=300, help="сколько кадров проанализировать")
+    parser.add_argument("--stride", type=int, help="шаг между кадрами (по умолчанию — равномерно по видео)")
+    parser.add_argument("--batch", type=int, default=8, help="кадров в одном вызове детектора")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--cluster-iou", type=float, default=0.5)
+    parser.add_argument("--min-frames", type=int, default=3,
+                        help="минимальное число кадров, на которых место занято (отсекает проезжающие машины; "
+                             "при маленьком --stride увеличьте)")
+    args = parser.parse_args()
+
+    cfg = OmegaConf.load(args.config)
+    source = args.video
+    if source is None:
+        if args.cam in cfg.get("test_videos", {}):
+            source = cfg.test_videos[args.cam].format(weather=cfg.get("weather", "sunny_day"))
+        elif args.cam in cfg.cameras:
+            source = cfg.cameras[args.cam].url
+        else:
+            print(f"❌ Камера или видео '{args.cam}' не найдена в config.yaml, укажите --video")
+            raise SystemExit(1)
+
+    detector = ObjectDetector(cfg.model.path, conf_threshold=cfg.model.conf_threshold)
+    calibrator = ParkingCalibrator(detector=detector, output_dir=args.output_dir)
+    zones = calibrator.calibrate_from_video(source, args.cam,
+                                            max_frames=args.frames,
+                                            stride=args.stride,
+                                            batch_size=args.batch,
+                                            imgsz=args.imgsz,
+                                            cluster_iou=args.cluster_iou,
+                                            min_frames=args.min_frames)
+
+    for slot_id, zone in zones.items():
+        print(f"{slot_id}: {zone['coords']}  occupancy {zone['occupancy']:.0%}  trust {zone['trust']}")
+    print(f"💾 {len(zones)} мест сохранено в {args.output_dir}/{args.cam}.json")
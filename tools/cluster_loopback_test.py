@@ -0,0 +1,126 @@
+import sys
+import json
+import socket
+import asyncio
+import argparse
+import tempfile
+
+from core.zone_manager import ZoneManager
+from core.aggregator import GlobalAggregator
+from core.cluster import ClusterWorker, ClusterAggregatorServer
+
+"""
+Проверка протокола worker ↔ aggregator (NDJSON поверх TCP) на loopback: агрегатор и worker —
+две задачи asyncio в одном процессе, обмен идёт через настоящий сокет.
+
+Сценарий: полное состояние при подключении → изменения и удаления мест → heartbeat →
+битая строка не рвёт соединение → переподключение в пределах grace сохраняет отчёты →
+полное состояние при переподключении удаляет места, удаление которых не дошло →
+отключение дольше grace удаляет отчёты камер узла.
+Запуск:
+    python -m tools.cluster_loopback_test
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for(condition, timeout=5.0, message="condition"):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError(f"Timed out waiting for {message}")
+        await asyncio.sleep(0.02)
+
+
+def reports(aggregator, cam_id):
+    return {slot_id: cams[cam_id] for slot_id, cams in aggregator.get_state().items() if cam_id in cams}
+
+
+async def run_loopback(grace):
+    port = free_port()
+    with tempfile.TemporaryDirectory() as zones_dir:
+        zone_manager = ZoneManager(zones_dir)
+        central = GlobalAggregator(zone_manager)
+        local = GlobalAggregator(zone_manager)
+        server = ClusterAggregatorServer(central, host="127.0.0.1", port=port, disconnect_grace=grace)
+        server_stop = asyncio.Event()
+        server_task = asyncio.create_task(server.run(server_stop))
+
+        local.update("cam1", {"s1": True, "s2": False})
+        worker = ClusterWorker("node1", ["cam1"], port=port, batch_interval=0.02, reconnect_delay=0.05,
+                               heartbeat_interval=0.1)
+        worker.attach(local)
+        worker_stop = asyncio.Event()
+        worker_task = asyncio.create_task(worker.run(worker_stop))
+
+        await wait_for(lambda: reports(central, "cam1") == {"s1": True, "s2": False}, message="initial full state")
+        print("✅ full state delivered on connect")
+
+        local.update("cam1", {"s1": False, "s3": True})
+        local.drop_reports("cam1", ["s2"])
+        await wait_for(lambda: reports(central, "cam1") == {"s1": False, "s3": True}, message="updates and removal")
+        print("✅ updates and removals delivered")
+
+        central.last_seen.pop("cam1", None)
+        await wait_for(lambda: "cam1" in central.last_seen, message="heartbeat")
+        print("✅ heartbeat keeps camera alive")
+
+        _, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"{not json\n" + (json.dumps({"type": "heartbeat", "node": "probe", "cameras": []}) + "\n").encode())
+        await writer.drain()
+        writer.close()
+        local.update("cam1", {"s4": False})
+        await wait_for(lambda: reports(central, "cam1").get("s4") is False, message="update after malformed line")
+        print("✅ malformed line from another client does not break the protocol")
+
+        # Короткий обрыв: worker переподключается раньше, чем истечёт grace — отчёты остаются
+        first_connection = server.nodes["node1"]["connection"]
+        worker_stop.set()
+        await worker_task
+        worker_stop = asyncio.Event()
+        worker_task = asyncio.create_task(worker.run(worker_stop))
+        await wait_for(lambda: server.nodes.get("node1", {}).get("connection") not in (None, first_connection),
+                       message="reconnect")
+        await asyncio.sleep(grace * 1.5)
+        assert reports(central, "cam1") == {"s1": False, "s3": True, "s4": False}, reports(central, "cam1")
+        print("✅ reconnect within grace keeps reports")
+
+        # Пакет с удалением потерян при обрыве: агрегатор всё ещё помнит место s9, которого у узла уже нет.
+        # Полное состояние после переподключения его убирает
+        central.update("cam1", {"s9": True})
+        second_connection = server.nodes["node1"]["connection"]
+        worker_stop.set()
+        await worker_task
+        worker_stop = asyncio.Event()
+        worker_task = asyncio.create_task(worker.run(worker_stop))
+        await wait_for(lambda: server.nodes.get("node1", {}).get("connection") not in (None, second_connection),
+                       message="second reconnect")
+        await wait_for(lambda: "s9" not in reports(central, "cam1"), message="stale slot removed by full state")
+        assert reports(central, "cam1") == {"s1": False, "s3": True, "s4": False}, reports(central, "cam1")
+        print("✅ full state on reconnect removes reports lost with an undelivered batch")
+
+        # Узел пропал: после grace отчёты его камер удалены
+        worker_stop.set()
+        await worker_task
+        await wait_for(lambda: not reports(central, "cam1"), timeout=grace + 5.0, message="drop after disconnect")
+        assert "node1" not in server.nodes and "cam1" not in central.last_seen
+        print("✅ disconnected node's reports dropped after grace")
+
+        server_stop.set()
+        await server_task
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worker ↔ aggregator loopback protocol test")
+    parser.add_argument("--grace", type=float, default=0.5, help="disconnect_grace агрегатора, сек")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_loopback(args.grace))
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print("✅ Cluster loopback test passed")
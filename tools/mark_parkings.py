@@ -1,16 +1,20 @@
 import cv2
 import json
+import numpy as np
 
 from pathlib import Path
 from omegaconf import OmegaConf
 from core.detector import ObjectDetector
+from core.preprocessing import FramePreprocessor
+from core.zone_geometry import polygon_bbox
 
 """
 Управление работой программы:
     [ЛКМ] — нарисовать зону
+    [P] — режим полигонов: [ЛКМ] — вершина, [Enter] — замкнуть полигон
     [Перетаскивание] — переместить существующую зону
     [ПКМ] — удалить зону
-    [Ctrl+Z] — отмена последней добавленной зоны
+    [Ctrl+Z] — отмена последней добавленной зоны (в режиме полигонов — последней вершины)
     [S] — сохранить в config/zones/{camX}.json
     [Ctrl+R] — сбросить все зоны
     [Колесо мыши] — масштабирование
@@ -22,6 +26,9 @@ class ManualSlotMarker:
         self.cfg = OmegaConf.load(config_path)
         self.cam_id = cam_id
         self.rectangles = []
+        self.polygons = []  # [[x, y], ...] — наклонные места, видимые с высоко установленных камер
+        self.polygon_mode = False
+        self.current_polygon = []
         self.dragging = False
         self.drag_idx = None
         self.drag_offset = (0, 0)
@@ -30,6 +37,10 @@ class ManualSlotMarker:
         self.display = None
         self.temp_x = 0 
         self.temp_y = 0
+        # Один препроцессор на камеру: CLAHE-оператор и буферы переиспользуются, режим auto копит статистику яркости.
+        # Разметка ведётся в исходном разрешении: координаты зон сохраняются в пикселях камеры
+        params = {**self.cfg.get("preprocessing", {}), "resolution": "full"}
+        self.preprocessor = FramePreprocessor.from_config(params, self.cam_id)
 
         self.output_dir = Path("config/zones")
         self.image_dir = Path("annotated")
@@ -41,9 +52,10 @@ class ManualSlotMarker:
         [INFO]
             Управление работой программы:
             [ЛКМ] — нарисовать зону
+            [P] — режим полигонов: [ЛКМ] — вершина, [Enter] — замкнуть полигон
             [Перетаскивание] — переместить существующую зону
             [ПКМ] — удалить зону
-            [Ctrl+Z] — отмена последней добавленной зоны
+            [Ctrl+Z] — отмена последней добавленной зоны (в режиме полигонов — последней вершины)
             [S] — сохранить в config/zones/{camX}.json
             [Ctrl+R] — сбросить все зоны
             [Колесо мыши] — масштабирование
@@ -91,6 +103,16 @@ class ManualSlotMarker:
                 cv2.putText(self.display, f"slot_{idx}", (x1, y1 - 5),
                             cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
 
+            for idx, polygon in enumerate(self.polygons, len(self.rectangles) + 1):
+                cv2.polylines(self.display, [np.array(polygon, dtype=np.int32)], True, (0, 255, 0), 2)
+                x1, y1, _, _ = polygon_bbox(polygon)
+                cv2.putText(self.display, f"slot_{idx}", (x1, y1 - 5),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+
+            if self.current_polygon:
+                cv2.polylines(self.display, [np.array(self.current_polygon + [[self.temp_x, self.temp_y]], dtype=np.int32)],
+                              False, (255, 0, 0), 1)
+
             if getattr(self, 'drawing', False):
                 cv2.rectangle(self.display, (self.ix, self.iy), (self.temp_x, self.temp_y), (255, 0, 0), 1)
 
@@ -100,11 +122,24 @@ class ManualSlotMarker:
             if key == ord("s"): # S
                 self.save()
                 break
+            elif key == ord("p"): # P
+                self.polygon_mode = not self.polygon_mode
+                self.current_polygon = []
+                print(f"🔷 Режим полигонов {'включён' if self.polygon_mode else 'выключен'}")
+            elif key == 13:     # Enter
+                if len(self.current_polygon) >= 3:
+                    self.polygons.append(self.current_polygon)
+                    print(f"🔷 Добавлен полигон из {len(self.current_polygon)} вершин")
+                self.current_polygon = []
             elif key == 18:     # Ctrl+R
                 self.rectangles.clear()
+                self.polygons.clear()
+                self.current_polygon = []
                 print("🔄 Все зоны сброшены")
             elif key == 26:     # Ctrl+Z
-                if self.rectangles:
+                if self.current_polygon:
+                    self.current_polygon.pop()
+                elif self.rectangles:
                     removed = self.rectangles.pop()
                     print(f"↩️ Удалён bbox: {removed}")
             elif key == 27:     # ESC
@@ -118,15 +153,11 @@ class ManualSlotMarker:
         return scaled
 
     def apply_clahe(self, frame):
-        lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
-        l, a, b = cv2.split(lab)
-        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-        cl = clahe.apply(l)
-        merged = cv2.merge((cl, a, b))
-        return cv2.cvtColor(merged, cv2.COLOR_LAB2BGR)
+        return self.preprocessor.process(frame).copy()
 
     def get_yolo_detections(self):
         print("🤖 Предобработка: YOLOv8 детекция...")
+        # Модель грузится один раз на процесс и переиспользуется для всех размечаемых камер
         detector = ObjectDetector(self.cfg.model.path, conf_threshold=self.cfg.model.conf_threshold)
         dets = detector.detect(self.orig_frame)
         rects = [[x1, y1, x2, y2] for x1, y1, x2, y2, *_ in dets]
@@ -136,7 +167,8 @@ class ManualSlotMarker:
     def save(self):
         zones = {}
         print("\n💬 Укажите реальные ID и trust для каждого парковочного места:")
-        for i, box in enumerate(self.rectangles):
+        shapes = [(box, None) for box in self.rectangles] + [(polygon_bbox(p), p) for p in self.polygons]
+        for i, (box, polygon) in enumerate(shapes):
             slot_name = f"slot_{i+1}"
             while True:
                 real_id = input(f"Введите ID для {slot_name}: ").strip()
@@ -160,6 +192,8 @@ class ManualSlotMarker:
                 "coords": box,
                 "trust": trust
             }
+            if polygon:
+                zones[real_id]["polygon"] = polygon
 
         json_path = self.output_dir / f"{self.cam_id}.json"
         img_path = self.image_dir / f"{self.cam_id}_marked_manual.jpg"
@@ -176,6 +210,10 @@ class ManualSlotMarker:
     def mouse_callback(self, event, x, y, flags, param):
         x, y = int(x / self.scale), int(y / self.scale)
 
+        if self.polygon_mode and event == cv2.EVENT_LBUTTONDOWN:
+            self.current_polygon.append([x, y])
+            return
+
         if event == cv2.EVENT_LBUTTONDOWN:
             for idx, (x1, y1, x2, y2) in enumerate(self.rectangles):
                 if x1 <= x <= x2 and y1 <= y <= y2:
@@ -187,7 +225,9 @@ class ManualSlotMarker:
             self.drawing = True
 
         elif event == cv2.EVENT_MOUSEMOVE:
-            if getattr(self, 'drawing', False):
+            if self.polygon_mode:
+                self.temp_x, self.temp_y = x, y
+            elif getattr(self, 'drawing', False):
                 self.temp_x, self.temp_y = x, y
             elif self.dragging and self.drag_idx is not None:
                 dx, dy = self.drag_offset
@@ -206,12 +246,17 @@ class ManualSlotMarker:
                 self.drag_idx = None
 
         elif event == cv2.EVENT_RBUTTONDOWN:
-            # Удалить bbox под курсором
+            # Удалить bbox или полигон под курсором
             for idx, (x1, y1, x2, y2) in enumerate(self.rectangles):
                 if x1 <= x <= x2 and y1 <= y <= y2:
                     removed = self.rectangles.pop(idx)
                     print(f"❌ Удалён bbox: {removed}")
-                    break
+                    return
+            for idx, polygon in enumerate(self.polygons):
+                if cv2.pointPolygonTest(np.array(polygon, dtype=np.int32), (x, y), False) >= 0:
+                    self.polygons.pop(idx)
+                    print(f"❌ Удалён полигон из {len(polygon)} вершин")
+                    return
 
         elif event == cv2.EVENT_MOUSEWHEEL:
             if flags > 0:
@@ -0,0 +1,94 @@
+import sys
+import argparse
+
+from core.qos import QosController, LEVEL_NORMAL, LEVEL_NAMES
+
+"""
+Проверка QosController на симулированном времени: вызовы повторяют цикл main.process_camera
+(кадр → mark_connected / should_process / record_decision, нет кадра → mark_disconnected),
+update() — как update_qos_periodically.
+
+Сценарий: камера без кадров (обрыв, переподключение) не поднимает уровень деградации —
+ни низкоприоритетная, ни защищённая; после восстановления потока она не считается просроченной;
+поднятый ранее уровень опускается, даже если оставшаяся камера мертва;
+а живая, но не успевающая камера по-прежнему поднимает уровень.
+Запуск:
+    python -m tools.qos_test
+"""
+
+CAMERAS = {"cam_main": {"priority": 3}, "cam_side": {"priority": 1}, "cam_yard": {"priority": 1}}
+
+
+def simulate(qos, seconds, dead=(), slow=(), start=0.0, tick=0.1, slow_period=10.0, update_interval=0.5):
+    """
+    :param dead: камеры, поток которых не отдаёт кадры
+    :param slow: камеры, принимающие решение раз в slow_period секунд
+    :return: (время конца, максимальный уровень за прогон)
+    """
+    steps = int(seconds / tick)
+    per_update = max(1, int(update_interval / tick))
+    max_level = qos.level
+    now = start
+    for step in range(1, steps + 1):
+        now = start + step * tick
+        for cam_id in qos.cameras:
+            if cam_id in dead:
+                qos.mark_disconnected(cam_id)
+                continue
+            qos.mark_connected(cam_id, now=now)
+            if cam_id in slow and step % int(slow_period / tick):
+                continue
+            if qos.should_process(cam_id):
+                qos.record_decision(cam_id, now=now)
+        if step % per_update == 0:
+            max_level = max(max_level, qos.update(now=now))
+    return now, max_level
+
+
+def new_controller():
+    qos = QosController(cameras=CAMERAS, default_max_staleness=5.0, escalate_after=3.0, recover_after=15.0)
+    for cam_id in CAMERAS:
+        qos.register(cam_id)
+        qos.record_decision(cam_id, now=0.0)
+    return qos
+
+
+def expect(condition, message):
+    if not condition:
+        raise AssertionError(message)
+
+
+def run_checks(seconds):
+    for dead_cam in ("cam_side", "cam_main"):
+        qos = new_controller()
+        _, max_level = simulate(qos, seconds, dead={dead_cam})
+        expect(max_level == LEVEL_NORMAL, f"dead {dead_cam} raised level to {LEVEL_NAMES[max_level]}")
+        print(f"✅ {dead_cam} without frames for {seconds:.0f}s: level stays {LEVEL_NAMES[LEVEL_NORMAL]}")
+
+    qos = new_controller()
+    now, _ = simulate(qos, seconds, dead={"cam_yard"})
+    _, max_level = simulate(qos, seconds, start=now)
+    expect(max_level == LEVEL_NORMAL, f"reconnected camera raised level to {LEVEL_NAMES[max_level]}")
+    print("✅ reconnected camera starts with a fresh deadline")
+
+    qos = new_controller()
+    now, max_level = simulate(qos, seconds, slow={"cam_main"})
+    expect(max_level > LEVEL_NORMAL, "live camera past its deadline did not raise the level")
+    print(f"✅ live late camera still escalates (reached {LEVEL_NAMES[max_level]})")
+
+    # Поднятый уровень опускается, когда отстававшая камера пропала, а остальные успевают
+    now, _ = simulate(qos, qos.recover_after * 4, dead={"cam_main"}, start=now)
+    expect(qos.level == LEVEL_NORMAL, f"level stuck at {LEVEL_NAMES[qos.level]} after late camera went dead")
+    print("✅ level recovers when the late camera stops delivering frames")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="QoS degradation checks with a camera that delivers no frames")
+    parser.add_argument("--seconds", type=float, default=120.0, help="симулированная длительность сценария, сек")
+    args = parser.parse_args()
+    try:
+        run_checks(args.seconds)
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print("✅ QoS test passed")
@@ -0,0 +1,221 @@
+import gc
+import os
+import logging
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+from omegaconf import OmegaConf
+
+from core.synthetic import SyntheticDetector, build_synthetic_cameras
+from core.cascade import CascadeDetector
+from core.detection_cache import DetectionCache
+from core.zone_manager import ZoneManager
+from core.occupancy_analyzer import OccupancyAnalyzer
+from core.aggregator import GlobalAggregator
+from core.status_api import StatusPublisher
+from core.display_board import DisplayBoard
+
+"""
+Длительный «soak»-тест на рост памяти: настоящий цикл камеры main.process_camera
+(захват → детекция → анализ → агрегация → события → отрисовка) на синтетических камерах.
+
+Источники — synthetic:// с realtime=0: сцена идёт с той скоростью, с какой её успевает обрабатывать
+конвейер, поэтому занятость мест меняется во много раз чаще, чем в реальном времени. Фильтр и
+устаревание отчётов работают по настоящим часам, их окна уменьшаются параметрами.
+Детектор собран так же, как в main.build_detector: кэш → каскад → модель (здесь — заглушка),
+поэтому проверяется и состояние кэша, каскада, счётчика пропускной способности и last_statuses.
+
+Камеры периодически заменяются новыми (смена cam_id): старая останавливается своим stop_event,
+её зоны выгружаются, отчёты устаревают через report_ttl — состояние удалённых камер должно вытесняться.
+Периодически снимаются tracemalloc и RSS; после прогрева рост сверх бюджета — ошибка (код выхода 1).
+Запуск:
+    python -m tools.soak_test --minutes 30 --cameras 8 --budget-mb 10
+"""
+
+
+def current_rss_mb():
+    """Текущий RSS процесса (Linux — /proc/self/statm, иначе — пиковый RSS из resource)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def cameras_in_state(zone_manager, analyzer, aggregator, cascade, detection_cache, throughput, display_board):
+    """Камеры, о которых помнит каждая часть конвейера: {часть: множество cam_id}."""
+    return {
+        "zones": set(zone_manager.zone_map),
+        "analyzer": set(analyzer.frame_index) | set(analyzer.latest_stable_status),
+        "aggregator": set(aggregator.last_seen),
+        "cache": set(detection_cache.entries) | set(detection_cache.get_stats()),
+        "cascade": set(cascade.get_stats()),
+        "throughput": set(throughput),
+        "display": set(display_board.frames),
+    }
+
+
+async def run_soak(args, workdir):
+    # Импорт main создаёт папки логов относительно текущей папки — к этому моменту это workdir
+    from main import process_camera, expire_stale_state_periodically, print_aggregated_status_periodically
+    logging.disable(logging.INFO)  # события мест и пропускная способность не засоряют вывод замеров
+
+    url_template = f"synthetic://{args.resolution}@{args.fps}?cars={args.cars}&seed={{index}}&realtime=0"
+    zones_dir = Path(workdir) / "zones"
+
+    zone_manager = ZoneManager(zones_dir, iou_threshold=0.5)
+    analyzer = OccupancyAnalyzer(zone_manager, window_seconds=args.window, min_confirmations=3,
+                                 incremental=args.incremental)
+    aggregator = GlobalAggregator(zone_manager, report_ttl=args.report_ttl)
+    publisher = StatusPublisher(aggregator)
+    display_board = DisplayBoard(width=1280, height=720, max_columns=2)
+    cascade = CascadeDetector(SyntheticDetector(), SyntheticDetector(), zone_manager)
+    detection_cache = DetectionCache(cascade, ttl_seconds=args.cache_ttl)
+    throughput = Counter()
+
+    # Запас синтетических камер: каждая замена берёт следующую, старая останавливается
+    replacements = int(args.minutes * 60 / args.churn_seconds) + 1 if args.churn_seconds else 0
+    sources = build_synthetic_cameras(args.cameras + replacements, url_template, zones_dir, prefix="soak")
+    pending = list(sources.items())
+
+    stop_event = asyncio.Event()
+    running = {}  # cam_id → (stop_event камеры, задача process_camera)
+
+    def start_camera(cam_id, url):
+        cam_stop = asyncio.Event()
+        task = asyncio.create_task(process_camera(
+            cam_id, OmegaConf.create({"url": url}), detection_cache, zone_manager, analyzer, aggregator,
+            "synthetic", cam_stop, display_board, preprocessing_cfg={"clahe": "auto"},
+            record=False, throughput=throughput, console="off"))
+        running[cam_id] = (cam_stop, task)
+
+    async def stop_camera(cam_id):
+        cam_stop, task = running.pop(cam_id)
+        cam_stop.set()
+        await task
+        # Камера убрана из конфигурации: зоны больше не нужны, отчёты устареют через report_ttl
+        zone_manager.unload_zones(cam_id)
+
+    async def churn():
+        while not stop_event.is_set():
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=args.churn_seconds)
+            except asyncio.TimeoutError:
+                pass
+            if stop_event.is_set() or not pending:
+                continue
+            await stop_camera(next(iter(running)))
+            start_camera(*pending.pop(0))
+
+    for cam_id, url in pending[:args.cameras]:
+        start_camera(cam_id, url)
+    pending = pending[args.cameras:]
+
+    background = [asyncio.create_task(expire_stale_state_periodically(aggregator, analyzer, stop_event,
+                                                                      interval=max(0.5, args.report_ttl / 4))),
+                  asyncio.create_task(print_aggregated_status_periodically(publisher, stop_event,
+                                                                           interval=args.sample_seconds,
+                                                                           detection_cache=detection_cache,
+                                                                           cascade=cascade, throughput=throughput,
+                                                                           console="off"))]
+    if args.churn_seconds:
+        background.append(asyncio.create_task(churn()))
+
+    tracemalloc.start(10)
+    baseline = None
+    samples = []
+    duration = args.minutes * 60
+    wall_start = time.perf_counter()
+
+    while True:
+        await asyncio.sleep(min(args.sample_seconds, max(0.0, duration - (time.perf_counter() - wall_start))))
+        elapsed = time.perf_counter() - wall_start
+
+        gc.collect()
+        traced, _ = tracemalloc.get_traced_memory()
+        sample = (elapsed / 60, traced / 2 ** 20, current_rss_mb())
+        samples.append(sample)
+        state = cameras_in_state(zone_manager, analyzer, aggregator, cascade, detection_cache, throughput,
+                                 display_board)
+        print(f"[soak] {sample[0]:6.1f} min  traced {sample[1]:8.2f} MB  RSS {sample[2]:8.1f} MB  "
+              f"slots {len(publisher.status)}  running {len(running)}  "
+              f"cameras in state {max(len(cams) for cams in state.values())}", flush=True)
+        if baseline is None and elapsed >= duration * args.warmup:
+            baseline = (sample, tracemalloc.take_snapshot())
+        if elapsed >= duration:
+            break
+
+    stop_event.set()
+    for cam_id in list(running):
+        await stop_camera(cam_id)
+    await asyncio.gather(*background)
+
+    # Последний замер должен быть позже базового, иначе роста не измерить
+    if baseline is None or baseline[0] is samples[-1]:
+        print(f"[soak] ❌ No samples after warm-up ({len(samples)} samples, warm-up {args.warmup:.0%} "
+              f"of {args.minutes} min): lower --warmup or --sample-seconds, or raise --minutes")
+        tracemalloc.stop()
+        return False
+
+    base_sample, base_snapshot = baseline
+    final = samples[-1]
+    traced_growth = final[1] - base_sample[1]
+    rss_growth = final[2] - base_sample[2]
+    print(f"\n[soak] growth after warm-up: traced {traced_growth:+.2f} MB (budget {args.budget_mb} MB), "
+          f"RSS {rss_growth:+.1f} MB (budget {args.rss_budget_mb} MB)")
+
+    # Все камеры остановлены и выгружены; отчёты — до устаревания, остальное должно быть пусто
+    leftovers = {part: cams for part, cams in cameras_in_state(zone_manager, analyzer, aggregator, cascade,
+                                                                detection_cache, throughput, display_board).items()
+                 if cams and part not in ("aggregator", "analyzer")}
+    if leftovers:
+        print(f"[soak] ❌ Per-camera state left after all cameras stopped: {leftovers}")
+
+    failed = traced_growth > args.budget_mb or rss_growth > args.rss_budget_mb or bool(leftovers)
+    if failed or args.verbose:
+        print("[soak] top allocation growth since warm-up:")
+        for stat in tracemalloc.take_snapshot().compare_to(base_snapshot, "lineno")[:10]:
+            print(f"    {stat}")
+    tracemalloc.stop()
+    return not failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Long-run memory soak test of the camera loop")
+    parser.add_argument("--minutes", type=float, default=30.0, help="длительность прогона, мин")
+    parser.add_argument("--cameras", type=int, default=8)
+    parser.add_argument("--cars", type=int, default=40, help="мест на камеру")
+    parser.add_argument("--fps", type=int, default=10, help="кадров в секунду времени сцены")
+    parser.add_argument("--resolution", default="640x360")
+    parser.add_argument("--churn-seconds", type=float, default=60.0,
+                        help="каждые N секунд одна камера заменяется новой (0 — без замен)")
+    parser.add_argument("--report-ttl", type=float, default=10.0, help="устаревание отчётов молчащих камер, сек")
+    parser.add_argument("--window", type=float, default=2.0, help="окно фильтра флуктуаций, сек")
+    parser.add_argument("--cache-ttl", type=float, default=10.0, help="время жизни записей кэша детекций, сек")
+    parser.add_argument("--sample-seconds", type=float, default=30.0, help="период снятия памяти, сек")
+    parser.add_argument("--warmup", type=float, default=0.2, help="доля прогона до базового замера")
+    parser.add_argument("--budget-mb", type=float, default=10.0, help="допустимый рост tracemalloc после прогрева")
+    parser.add_argument("--rss-budget-mb", type=float, default=50.0, help="допустимый рост RSS после прогрева")
+    parser.add_argument("--incremental", action="store_true", help="инкрементальная оценка занятости по разнице детекций")
+    parser.add_argument("--verbose", action="store_true", help="всегда печатать топ роста аллокаций")
+    args = parser.parse_args()
+    if not 0.0 <= args.warmup < 1.0:
+        parser.error("--warmup must be in [0, 1)")
+
+    # Файлы зон, логи событий и снимки — во временной папке, рабочее дерево не засоряется
+    with tempfile.TemporaryDirectory(prefix="parking_soak_") as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            ok = asyncio.run(run_soak(args, workdir))
+        finally:
+            os.chdir(cwd)
+    print("✅ Soak test passed" if ok else "❌ Soak test failed")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,86 @@
+import cv2
+import json
+import argparse
+import numpy as np
+
+from pathlib import Path
+from core.roi_classifier import RoiOccupancyClassifier
+
+"""
+Обучение классификатора занятости по ROI, которые сохраняет log_slot_event:
+    logs/events/{slot_id}/{timestamp}/roi.jpg + meta.json
+
+Метка берётся из meta.json: new_status == "Free" → свободно.
+ROI должны быть вырезаны из кадра без разметки: рамка статуса (зелёная/красная) по краю ROI — это сама метка,
+а на инференсе классификатор видит чистые кадры. Такие ROI (события, записанные старыми версиями) пропускаются.
+Запуск:
+    python -m tools.train_roi_classifier --events logs/events --output models/roi_classifier.npz
+"""
+
+
+STATUS_COLORS = np.array([(0, 255, 0), (0, 0, 255)], dtype=np.int16)  # BGR рамок draw_parking_zones
+
+
+def has_status_overlay(roi, border=2, color_tolerance=60, min_fraction=0.15):
+    """
+    Проверяет, нарисована ли по краю ROI рамка статуса места.
+    :param border: ширина проверяемой полосы по краю, пикселей (толщина рамки — 2)
+    :param color_tolerance: допуск по каждому каналу (JPEG искажает цвета)
+    :param min_fraction: доля пикселей полосы цвета рамки, начиная с которой ROI считается размеченным
+    :return: bool
+    """
+    h, w = roi.shape[:2]
+    if h <= 2 * border or w <= 2 * border:
+        return False
+    strip = np.concatenate([roi[:border].reshape(-1, 3), roi[-border:].reshape(-1, 3),
+                            roi[:, :border].reshape(-1, 3), roi[:, -border:].reshape(-1, 3)]).astype(np.int16)
+    close = (np.abs(strip[:, None, :] - STATUS_COLORS[None, :, :]) <= color_tolerance).all(axis=2).any(axis=1)
+    return close.mean() >= min_fraction
+
+
+def load_samples(events_dir):
+    rois, labels = [], []
+    skipped = 0
+    for meta_path in sorted(Path(events_dir).glob("*/*/meta.json")):
+        roi_path = meta_path.parent / "roi.jpg"
+        if not roi_path.exists():
+            continue
+
+        roi = cv2.imread(str(roi_path))
+        if roi is None or roi.size == 0:
+            continue
+        if has_status_overlay(roi):
+            skipped += 1
+            continue
+
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        rois.append(roi)
+        labels.append(1.0 if meta.get("new_status") == "Free" else 0.0)
+    if skipped:
+        print(f"⚠️ Пропущено {skipped} ROI с рамкой статуса — они вырезаны из размеченного кадра")
+    return rois, np.array(labels, dtype=np.float32)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train ROI occupancy classifier")
+    parser.add_argument("--events", default="logs/events")
+    parser.add_argument("--output", default="models/roi_classifier.npz")
+    parser.add_argument("--input-size", type=int, default=64)
+    parser.add_argument("--epochs", type=int, default=300)
+    args = parser.parse_args()
+
+    rois, labels = load_samples(args.events)
+    if len(rois) == 0 or len(set(labels.tolist())) < 2:
+        print(f"❌ Недостаточно примеров в {args.events}: нужны и свободные, и занятые места")
+        raise SystemExit(1)
+
+    print(f"📦 Загружено {len(rois)} ROI ({int(labels.sum())} свободных, {int(len(labels) - labels.sum())} занятых)")
+
+    classifier = RoiOccupancyClassifier(input_size=args.input_size)
+    features = classifier.extract_features(rois)
+    classifier.fit(features, labels, epochs=args.epochs)
+    classifier.save(args.output)
+
+    print(f"💾 Модель сохранена в {args.output}")
@@ -0,0 +1,70 @@
+import sys
+import argparse
+
+import numpy as np
+
+from core.zone_geometry import ZoneGeometry
+
+"""
+Проверка растеризации полигональных зон: IoU через карту меток должен совпадать
+с аналитическим IoU прямоугольных зон при любом mask_scale.
+
+Сценарий: бокс, точно покрывающий прямоугольный полигон, даёт IoU ≈ 1 (в том числе для маленьких мест
+и координат, не кратных масштабу) → на случайных боксах полигональный путь не смещён относительно
+прямоугольного → площадь треугольника совпадает с геометрической.
+Запуск:
+    python -m tools.zone_geometry_test
+"""
+
+SCALES = (0.25, 0.5, 1.0, 0.33)
+RECTS = ([100, 100, 200, 200], [13, 7, 41, 29], [301, 55, 337, 121])
+
+
+def as_polygon(box):
+    x1, y1, x2, y2 = box
+    return [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]
+
+
+def expect(condition, message):
+    if not condition:
+        raise AssertionError(message)
+
+
+def run_checks(samples, seed):
+    for scale in SCALES:
+        geometry = ZoneGeometry({f"s{i}": {"coords": box, "polygon": as_polygon(box)} for i, box in enumerate(RECTS)},
+                                mask_scale=scale)
+        iou = geometry.iou_matrix([(*box, 2, 1.0) for box in RECTS])
+        expect(np.allclose(np.diag(iou), 1.0, atol=1e-3), f"mask_scale {scale}: exact box IoU {np.diag(iou)}")
+    print(f"✅ box exactly covering a rectangle polygon: IoU = 1 at mask_scale {SCALES}")
+
+    rng = np.random.default_rng(seed)
+    box = [100, 100, 200, 180]
+    starts = rng.uniform(60, 190, (samples, 2))
+    sizes = rng.uniform(20, 120, (samples, 2))
+    dets = [(x, y, x + w, y + h, 2, 1.0) for (x, y), (w, h) in zip(starts, sizes)]
+    for scale in SCALES:
+        rect = ZoneGeometry({"a": {"coords": box}}, mask_scale=scale).iou_matrix(dets)[0]
+        poly = ZoneGeometry({"a": {"coords": box, "polygon": as_polygon(box)}}, mask_scale=scale).iou_matrix(dets)[0]
+        bias, worst = float((poly - rect).mean()), float(np.abs(poly - rect).max())
+        expect(abs(bias) < 0.005, f"mask_scale {scale}: polygon IoU biased by {bias:+.4f}")
+        expect(worst < 0.06, f"mask_scale {scale}: polygon IoU off by {worst:.4f}")
+        print(f"✅ mask_scale {scale}: polygon vs rect IoU bias {bias:+.4f}, max error {worst:.4f}")
+
+    geometry = ZoneGeometry({"t": {"coords": [0, 0, 120, 120], "polygon": [[0, 0], [120, 0], [0, 120]]}}, mask_scale=0.5)
+    area = float(geometry.poly_areas[0]) / 0.5 ** 2
+    expect(abs(area - 7200) / 7200 < 0.02, f"triangle area {area:.0f} instead of 7200")
+    print(f"✅ triangle area {area:.0f} (exact 7200)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Polygon zone rasterization checks")
+    parser.add_argument("--samples", type=int, default=1000, help="случайных боксов для сравнения с прямоугольным путём")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    try:
+        run_checks(args.samples, args.seed)
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print("✅ Zone geometry test passed")